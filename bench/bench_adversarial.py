@@ -0,0 +1,84 @@
+r"""
+病态输入基准：单行约1MB的`-`、`|`、`*`、`_`、`` ` ``、`$`等，每种输入须在时间预算内完成
+
+运行（仓库根目录）：
+>>> python -m bench.bench_adversarial --mb 1 --budget 5
+同时以1/4大小再跑一次，耗时之比接近4说明代价随输入线性增长；超过预算时返回1
+"""
+import argparse
+import sys
+import time
+
+from md import MarkDown
+
+
+def cases(n: int) -> dict:
+    r"""
+    约`n`字节的病态输入
+    """
+    return {
+        "dashes": "-" * n,
+        "dashes+x": "-" * n + "x",
+        "dash-space+x": "- " * (n // 2) + "x",
+        "spaces+dash": " " * n + "-x",
+        "pipes": "|" * n,
+        "pipe-dash+x": "|-" * (n // 2) + "x",
+        "pipe-space+x": "| " * (n // 2) + "x",
+        "stars": "*" * n,
+        "star-word": "*a" * (n // 2),
+        "underscores": "_" * n,
+        "backticks": "`" * n,
+        "dollars": "$" * n,
+        "brackets": "[" * n,
+        "open-links": "[a](" * (n // 4),
+        "open-images": "![" * (n // 2),
+        "quotes": ">" * n,
+        # 表格：大量转义单元格
+        "table-escapes": "a|b\n-|-\n" + "\\|" * (n // 2),
+        # 表格：列数超过上限的表头后跟大量短行
+        "table-padding": "|".join("a" * (n // 16))
+        + "\n"
+        + "|".join("-" * (n // 16))
+        + "\n|" * (n // 16),
+    }
+
+
+def run(text: str) -> float:
+    start = time.perf_counter()
+    MarkDown().convert(text)
+    return time.perf_counter() - start
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=1.0)
+    parser.add_argument("--budget", type=float, default=5.0, help="每种输入的秒数上限")
+    parser.add_argument("--cases", nargs="+", default=None)
+    args = parser.parse_args(argv)
+
+    n = int(args.mb * (1 << 20))
+    small = cases(n // 4)
+    full = cases(n)
+    names = args.cases or list(full)
+
+    failures = []
+    print("%-16s %10s %10s %7s" % ("case", "1/4 (s)", "full (s)", "ratio"))
+    for name in names:
+        t_small = run(small[name])
+        t_full = run(full[name])
+        mark = ""
+        if t_full > args.budget:
+            failures.append(name)
+            mark = "  OVER BUDGET"
+        print(
+            "%-16s %10.3f %10.3f %6.1fx%s"
+            % (name, t_small, t_full, t_full / max(t_small, 1e-6), mark)
+        )
+    if failures:
+        print("over budget: %s" % ", ".join(failures), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+r"""
+asyncio转换基准：转换大文档的同时，测量事件循环的调度延迟
+
+运行（仓库根目录）：
+>>> python -m bench.bench_async --mb 2 --requests 4
+一个每隔`--interval`毫秒醒来一次的任务记录实际醒来比预期晚了多少；
+在事件循环中直接调用`convert`时延迟随文档大小增长，`aconvert`与`aconvert_stream`应保持平稳；
+process为使用进程池的`aconvert`，不与事件循环争用GIL，也不在本进程中产生待gc扫描的节点树
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from bench.generators import mixed
+from m2h.aio import AsyncExecutor
+from md import MarkDown
+
+
+async def ticker(interval: float, lags: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def blocking(md: MarkDown, text: str):
+    # 反例：在事件循环中直接转换
+    await asyncio.sleep(0)
+    return md.convert(text)
+
+
+async def offloaded(md: MarkDown, text: str):
+    return await md.aconvert(text)
+
+
+async def streamed(md: MarkDown, text: str):
+    return "".join([chunk async for chunk in md.aconvert_stream(text.splitlines(True))])
+
+
+async def scenario(convert, text: str, requests: int, interval: float, executor):
+    r"""
+    :return (总耗时, 排序后的各次延迟)
+    """
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(interval, lags, stop))
+    await asyncio.sleep(interval * 5)
+    start = time.perf_counter()
+    if convert is not None:
+        await asyncio.gather(
+            *[convert(MarkDown(executor=executor), text) for _ in range(requests)]
+        )
+    else:
+        await asyncio.sleep(0.5)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    lags.sort()
+    return elapsed, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=2.0)
+    parser.add_argument("--requests", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=1.0, help="毫秒")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    text = mixed(int(args.mb * (1 << 20)))
+    interval = args.interval / 1e3
+    executor = AsyncExecutor(max_workers=args.workers)
+    processes = AsyncExecutor(max_workers=args.workers, processes=True)
+
+    print(
+        "%-10s %9s %9s %9s %9s %7s"
+        % ("mode", "total(s)", "p50(ms)", "p99(ms)", "max(ms)", "ticks")
+    )
+    for name, convert, pool in (
+        ("idle", None, executor),
+        ("blocking", blocking, executor),
+        ("aconvert", offloaded, executor),
+        ("process", offloaded, processes),
+        ("stream", streamed, executor),
+    ):
+        elapsed, lags = asyncio.run(
+            scenario(convert, text, args.requests, interval, pool)
+        )
+        print(
+            "%-10s %9.2f %9.2f %9.2f %9.2f %7d"
+            % (
+                name,
+                elapsed,
+                statistics.median(lags) * 1e3,
+                lags[int(len(lags) * 0.99)] * 1e3,
+                lags[-1] * 1e3,
+                len(lags),
+            )
+        )
+    executor.shutdown()
+    processes.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+r"""
+字节输入基准：convert_bytes vs 先decode再convert、结果再encode，比较耗时与峰值内存
+
+运行（仓库根目录）：
+>>> python -m bench.bench_bytes --mb 16
+输入为带BOM、CRLF换行的utf-8字节；计时与峰值内存分两次运行，后者由tracemalloc统计，
+不含输入本身
+"""
+import argparse
+import codecs
+import gc
+import time
+import tracemalloc
+
+from bench.generators import mixed
+from md import MarkDown
+
+
+def decode_convert(data: bytes) -> bytes:
+    text = codecs.decode(data, "utf-8-sig").replace("\r\n", "\n")
+    return MarkDown().convert(text).encode("utf-8")
+
+
+def convert_bytes(data: bytes) -> bytes:
+    return MarkDown().convert_bytes(memoryview(data))
+
+
+def measure(func, data: bytes) -> tuple:
+    # tracemalloc会显著拖慢分配，不与计时同时进行
+    gc.collect()
+    start = time.perf_counter()
+    html = func(data)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    func(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return html, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=16.0)
+    args = parser.parse_args()
+
+    text = mixed(int(args.mb * (1 << 20)))
+    data = codecs.BOM_UTF8 + text.replace("\n", "\r\n").encode("utf-8")
+    print("input %.1f MB" % (len(data) / 1e6))
+    print("%-14s %10s %10s %14s" % ("mode", "seconds", "MB/s", "peak MB"))
+
+    expected = None
+    modes = (("decode+convert", decode_convert), ("convert_bytes", convert_bytes))
+    for name, func in modes:
+        html, elapsed, peak = measure(func, data)
+        expected = expected or html
+        assert html == expected, "output mismatch"
+        print(
+            "%-14s %10.2f %10.2f %14.1f"
+            % (name, elapsed, len(data) / 1e6 / elapsed, peak / 1e6)
+        )
+
+
+if __name__ == "__main__":
+    main()
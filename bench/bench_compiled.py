@@ -0,0 +1,82 @@
+r"""
+已编译节点树基准：同一文档在多个配置下输出，载入+渲染 vs 每个配置完整重新转换
+
+运行（仓库根目录）：
+>>> python -m bench.bench_compiled --mb 4 --configs 4
+编译与写出只做一次，不计入每个配置的耗时；载入使用内存映射
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bench.generators import mixed
+from m2h.compiled import CompiledTree
+from m2h.config import Config
+from md import MarkDown
+
+
+def make_configs(n: int) -> list:
+    r"""
+    各前端使用的配置变体：包装标签与属性各不相同
+    """
+    return [
+        Config(
+            markdown_tag="div",
+            markdown_attr={"class": "markdown-body-%d" % i},
+            code_tag="pre" if i % 2 else "my-code",
+            code_attr={"class": "hl-%d" % i},
+            formula_attr={"type": "math/tex", "data-variant": str(i)},
+        )
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=4.0)
+    parser.add_argument("--configs", type=int, default=4)
+    args = parser.parse_args()
+
+    text = mixed(int(args.mb * (1 << 20)))
+    configs = make_configs(args.configs)
+
+    start = time.perf_counter()
+    data = CompiledTree.from_text(text).dumps()
+    t_compile = time.perf_counter() - start
+    print(
+        "input %.1f MB, compiled %.1f MB in %.2fs"
+        % (len(text) / 1e6, len(data) / 1e6, t_compile)
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "doc.m2ht")
+        with open(path, "wb") as f:
+            f.write(data)
+
+        print("%-8s %12s %12s %9s" % ("config", "reconvert", "load+render", "speedup"))
+        total_convert = total_render = 0.0
+        for i, config in enumerate(configs):
+            start = time.perf_counter()
+            expected = MarkDown(config).convert(text)
+            t_convert = time.perf_counter() - start
+
+            start = time.perf_counter()
+            html = CompiledTree.load(path).render(config)
+            t_render = time.perf_counter() - start
+            assert html == expected, "output mismatch"
+
+            total_convert += t_convert
+            total_render += t_render
+            print(
+                "%-8d %12.3f %12.3f %8.2fx"
+                % (i, t_convert, t_render, t_convert / t_render)
+            )
+        print(
+            "%-8s %12.3f %12.3f %8.2fx"
+            % ("total", total_convert, total_render, total_convert / total_render)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+r"""
+dom补丁基准：增量更新后只传输补丁 vs 重新传输整棵dom树
+对大文档做若干单行编辑，比较补丁与整棵树的json大小，以及生成所需的时间
+
+运行（仓库根目录）：
+>>> python -m bench.bench_diff --mb 2 --edits 50
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from bench.generators import mixed
+from m2h.diff import apply_patch
+from md import MarkDown
+
+
+def edits(lines: list, count: int, seed: int = 0):
+    r"""
+    随机的单行编辑：改写一个词、插入一行、删除一行，各占三分之一
+    不编辑代码区与公式区的起止行，否则其后的全文都会变化，补丁退化为整体替换
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        i = rng.randrange(len(lines))
+        while lines[i].lstrip(" ").startswith(("```", "$$")):
+            i = rng.randrange(len(lines))
+        kind = rng.randrange(3)
+        if kind == 0:
+            words = lines[i].split(" ")
+            words[rng.randrange(len(words))] = "edited"
+            yield (i, i + 1), " ".join(words)
+        elif kind == 1:
+            yield (i, i), "inserted **line** %d" % i
+        else:
+            yield (i, i + 1), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=2.0)
+    parser.add_argument("--edits", type=int, default=50)
+    args = parser.parse_args()
+
+    text = mixed(int(args.mb * (1 << 20)))
+    md = MarkDown()
+    md.convert(text)
+    md.update((0, 0), "")
+    lines = md._document.lines
+    print("input %.1f MB, %d lines" % (len(text) / 1e6, len(lines)))
+
+    full_sizes, full_times, patch_sizes, patch_times, op_counts = [], [], [], [], []
+    verified = False
+    for edit_range, new_text in edits(lines, args.edits):
+        previous = md.get_dom_view()
+        tree = None if verified else md.get_dom_tree()
+        md.update(edit_range, new_text)
+
+        start = time.perf_counter()
+        ops = md.diff_dom(previous)
+        patch = json.dumps(ops, ensure_ascii=False)
+        patch_times.append(time.perf_counter() - start)
+        patch_sizes.append(len(patch.encode("utf-8")))
+        op_counts.append(len(ops))
+
+        start = time.perf_counter()
+        full = json.dumps(md.get_dom_tree(), ensure_ascii=False)
+        full_times.append(time.perf_counter() - start)
+        full_sizes.append(len(full.encode("utf-8")))
+
+        # 首次编辑校验补丁的正确性
+        if not verified:
+            assert apply_patch(tree, ops) == md.get_dom_tree()
+            verified = True
+
+    def median(values):
+        return statistics.median(values)
+
+    print("median of %d edits" % args.edits)
+    print(
+        "full tree   %10d bytes  %8.2fms"
+        % (median(full_sizes), median(full_times) * 1e3)
+    )
+    print(
+        "patch       %10d bytes  %8.2fms  (%d ops, %.0fx smaller, %.0fx faster)"
+        % (
+            median(patch_sizes),
+            median(patch_times) * 1e3,
+            median(op_counts),
+            median(full_sizes) / median(patch_sizes),
+            median(full_times) / median(patch_times),
+        )
+    )
+    print("largest patch %8d bytes  (%d ops)" % (max(patch_sizes), max(op_counts)))
+
+
+if __name__ == "__main__":
+    main()
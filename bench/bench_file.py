@@ -0,0 +1,97 @@
+r"""
+大文件基准：convert_file（内存映射、逐行解码、流式写出）vs 整篇读入后convert
+
+运行（仓库根目录）：
+>>> python -m bench.bench_file --mb 1024
+>>> python -m bench.bench_file --mb 64 --modes file read
+每种方式在独立的子进程中运行，报告耗时与子进程的峰值常驻内存
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.generators import mixed
+
+# 子进程中运行的转换代码，输出json：{"seconds": ..., "max_rss_mb": ...}
+CHILD = r"""
+import json, resource, sys, time
+from md import MarkDown
+mode, src, dst = sys.argv[1:4]
+start = time.perf_counter()
+if mode == "file":
+    MarkDown().convert_file(src, dst)
+else:
+    with open(src, encoding="utf-8") as f:
+        html = MarkDown().convert(f.read())
+    with open(dst, "w", encoding="utf-8") as f:
+        f.write(html)
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# linux以KB计，macOS以字节计
+scale = 1 if sys.platform == "darwin" else 1024
+print(json.dumps({"seconds": seconds, "max_rss_mb": rss * scale / 1e6}))
+"""
+
+
+def make_file(path: str, mb: float, block_mb: float = 4.0):
+    r"""
+    重复写入一段混合文档，直至约`mb`兆字节
+    """
+    block = mixed(int(block_mb * (1 << 20))) + "\n\n"
+    data = block.encode("utf-8")
+    with open(path, "wb") as f:
+        for _ in range(max(1, int(mb * (1 << 20) / len(data)))):
+            f.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=1024.0)
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        default=["file"],
+        choices=["file", "read"],
+        help="read整篇读入，所需内存为输入的数十倍，只适合小文件",
+    )
+    parser.add_argument("--dir", default=None, help="临时文件目录")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        src = os.path.join(tmp, "input.md")
+        dst = os.path.join(tmp, "output.html")
+        start = time.perf_counter()
+        make_file(src, args.mb)
+        size = os.path.getsize(src)
+        elapsed = time.perf_counter() - start
+        print("input %.1f MB, generated in %.1fs" % (size / 1e6, elapsed))
+
+        print("%-6s %10s %10s %14s" % ("mode", "seconds", "MB/s", "peak RSS MB"))
+        for mode in args.modes:
+            out = subprocess.run(
+                [sys.executable, "-c", CHILD, mode, src, dst],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(out)
+            print(
+                "%-6s %10.1f %10.2f %14.1f"
+                % (
+                    mode,
+                    result["seconds"],
+                    size / 1e6 / result["seconds"],
+                    result["max_rss_mb"],
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
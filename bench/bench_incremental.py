@@ -0,0 +1,81 @@
+r"""
+增量更新基准：MarkDown.update 单行编辑 vs 整篇 convert
+
+运行（仓库根目录）：
+>>> python -m bench.bench_incremental --lines 10000 --edits 200
+"""
+import argparse
+import random
+import statistics
+import time
+
+from md import MarkDown
+
+BLOCKS = [
+    ["## Section {0}", ""],
+    ["Paragraph {0} with *italic*, **bold** and `code`.", ""],
+    ["- item {0}", "- item [link](https://example.com/{0})", "    - nested", ""],
+    ["> quote {0}", ""],
+    ["```python", "def f{0}():", "    return {0}", "```", ""],
+    ["$$", "x_{0} = y^2", "$$", ""],
+    ["| a | b |", "|:-|-:|", "| {0} | *v* |", ""],
+]
+
+
+def make_document(lines: int, seed: int = 0) -> list:
+    r"""
+    生成由各类顶层块组成、约`lines`行的文档
+    """
+    rnd = random.Random(seed)
+    out = []
+    i = 0
+    while len(out) < lines:
+        out.extend(line.format(i) for line in rnd.choice(BLOCKS))
+        i += 1
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--verify", action="store_true", help="逐次与整篇转换比对")
+    args = parser.parse_args()
+
+    lines = make_document(args.lines)
+    text = "\n".join(lines)
+    md = MarkDown()
+
+    start = time.perf_counter()
+    md.convert(text)
+    t_full = time.perf_counter() - start
+
+    # 首次update会做一次带分段信息的完整解析
+    start = time.perf_counter()
+    md.update((0, 1), lines[0])
+    t_first = time.perf_counter() - start
+
+    rnd = random.Random(1)
+    timings = []
+    for n in range(args.edits):
+        idx = rnd.randrange(len(lines))
+        # 模拟输入：在行尾追加一个字符（空行保持为空，避免改变分段）
+        if lines[idx] != "":
+            lines[idx] += "x"
+        start = time.perf_counter()
+        html = md.update((idx, idx + 1), lines[idx])
+        timings.append(time.perf_counter() - start)
+        if args.verify:
+            assert html == MarkDown().convert("\n".join(lines)), "output mismatch"
+
+    timings.sort()
+    print("lines            %d" % len(lines))
+    print("full convert     %.3f ms" % (t_full * 1e3))
+    print("first update     %.3f ms" % (t_first * 1e3))
+    print("update median    %.3f ms" % (statistics.median(timings) * 1e3))
+    print("update p95       %.3f ms" % (timings[int(len(timings) * 0.95)] * 1e3))
+    print("speedup(median)  %.0fx" % (t_full / statistics.median(timings)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+r"""
+内嵌解析基准：原先逐种findall再整串replace的流程 vs 逐个调用六个 extract_*（各一次正则替换）
+vs extract_inline
+
+运行（仓库根目录）：
+>>> python -m bench.bench_inline --words 2000 --repeat 20
+后两者输出须完全一致；与原先流程的差别只来自其整串replace会替换同一字面量的所有出现处，
+最后一列给出输出是否一致
+"""
+import argparse
+import random
+import time
+
+from m2h.compiler import BOLD, I_CODE, I_FORMULAR, IMG, ITALIC, LINK, Compiler
+from m2h.config import Config
+from m2h.mdNode import MarkDownNode
+
+# 内嵌片段，后半部分相互重叠或嵌套，检验粗体先于斜体等顺序
+FRAGMENTS = [
+    "![logo{0}](img/{0}.png)",
+    "[link{0}](https://example.com/{0})",
+    "**bold{0}**",
+    "__bold{0}__",
+    "*italic{0}*",
+    "`code{0}`",
+    "$x^{0}$",
+    "2 * {0} = x and **bold{0}** here",
+    "snake_case{0} and __init{0}__",
+    "*a{0} **b{0}** c*",
+    "***x{0}***",
+    "[**label{0}**](a/{0}.md)",
+    "`a_{0}_b`",
+]
+
+
+def make_paragraph(words: int, markup_ratio: float = 0.3, seed: int = 0) -> str:
+    r"""
+    生成一段长的、内嵌标识密集的段落
+    :param words --词数
+    :param markup_ratio --带标识的词所占比例
+    """
+    rnd = random.Random(seed)
+    out = []
+    for i in range(words):
+        if rnd.random() < markup_ratio:
+            out.append(rnd.choice(FRAGMENTS).format(i))
+        else:
+            out.append("word%d" % i)
+    return " ".join(out)
+
+
+def baseline_inline(parent, text: str) -> str:
+    r"""
+    原先的流程：每种标识findall后逐个在整串上replace
+    """
+    for alt, src in IMG.findall(text):
+        text = text.replace(
+            "![%s](%s)" % (alt, src), '<img src="%s" alt="%s"/>' % (src, alt)
+        )
+    for label, href in LINK.findall(text):
+        text = text.replace(
+            "[%s](%s)" % (label, href), '<a href="%s">%s</a>' % (href, label)
+        )
+    for bold in BOLD.findall(text):
+        text = text.replace(bold, "<b>%s</b>" % bold.strip(bold[0]))
+    for italic in ITALIC.findall(text):
+        text = text.replace(italic, "<i>%s</i>" % italic.strip(italic[0]))
+    for code in I_CODE.findall(text):
+        code = "`%s`" % code
+        text = text.replace(code, Compiler.extract_inner_code(parent, code))
+    for formula in I_FORMULAR.findall(text):
+        formula = "$%s$" % formula
+        text = text.replace(formula, Compiler.extract_inner_formula(parent, formula))
+    return text
+
+
+def phased_inline(parent, text: str) -> str:
+    r"""
+    依次调用六个 extract_*
+    """
+    text = Compiler.extract_image(text)
+    text = Compiler.extract_link(text)
+    text = Compiler.extract_bold(text)
+    text = Compiler.extract_italic(text)
+    text = Compiler.extract_inner_code(parent, text)
+    text = Compiler.extract_inner_formula(parent, text)
+    return text
+
+
+def timeit(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--words", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--ratio", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    parent = MarkDownNode(tag="div")
+    parent.set_config(Config())
+
+    print(
+        "%8s %12s %12s %12s %8s %9s"
+        % ("words", "baseline(ms)", "phased(ms)", "inline(ms)", "speedup", "baseline")
+    )
+    for words in args.words:
+        text = make_paragraph(words, args.ratio)
+        html = Compiler.extract_inline(parent, text)
+        assert phased_inline(parent, text) == html, "output mismatch"
+        same = baseline_inline(parent, text) == html
+        t_base = timeit(lambda: baseline_inline(parent, text), args.repeat)
+        t_phased = timeit(lambda: phased_inline(parent, text), args.repeat)
+        t_new = timeit(lambda: Compiler.extract_inline(parent, text), args.repeat)
+        print(
+            "%8d %12.3f %12.3f %12.3f %7.1fx %9s"
+            % (
+                words,
+                t_base * 1e3,
+                t_phased * 1e3,
+                t_new * 1e3,
+                t_base / t_new,
+                "same" if same else "differs",
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+r"""
+内嵌解析缓存基准：inline_memo 取 False / True / "auto" 时各文档的耗时与命中率
+
+运行（仓库根目录）：
+>>> python -m bench.bench_memo --mb 4
+report为单元格大量重复的表格（`null`、状态、固定链接），prose为几乎不重复的正文
+"""
+import argparse
+import random
+import time
+
+from bench.generators import inline_prose, mixed, single, tables
+from m2h.config import Config
+from m2h.memo import INLINE_MEMO
+from md import MarkDown
+
+CELLS = (
+    "`null`",
+    "`true`",
+    "`false`",
+    "**required**",
+    "*optional*",
+    "[docs](https://example.com/docs)",
+    "`string`",
+    "`int`",
+    "-",
+)
+
+
+def report(size: int, seed: int = 0) -> str:
+    r"""
+    接口文档风格的表格：字段名各不相同，其余单元格取自少量固定取值
+    """
+    rnd = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        block = ["| name | type | default | required | see |", "|---|---|---|---|---|"]
+        for i in range(rnd.randint(5, 40)):
+            cells = ["`field_%d`" % rnd.randrange(1000)]
+            cells += [rnd.choice(CELLS) for _ in range(4)]
+            block.append("| " + " | ".join(cells) + " |")
+        block.append("")
+        lines.extend(block)
+        total += sum(len(line) + 1 for line in block)
+    return "\n".join(lines)
+
+
+CORPORA = {
+    "report": report,
+    "tables": single(tables),
+    "prose": single(inline_prose),
+    "mixed": mixed,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=4.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    modes = (False, True, "auto")
+    print("%-8s %-6s %10s %9s %9s" % ("corpus", "memo", "cpu s", "speedup", "hit"))
+    for name, gen in CORPORA.items():
+        text = gen(int(args.mb * (1 << 20)))
+        best = dict.fromkeys(modes, float("inf"))
+        hit = {}
+        expected = None
+        # 各模式交替运行取最小值，减小机器负载波动的影响
+        for _ in range(args.repeat):
+            for memo in modes:
+                md = MarkDown(Config(inline_memo=memo))
+                # 每轮从空缓存开始，命中只来自文档内部的重复
+                INLINE_MEMO.clear()
+                start = time.process_time()
+                html = md.convert(text)
+                best[memo] = min(best[memo], time.process_time() - start)
+                hit[memo] = INLINE_MEMO.hit_rate()
+                expected = expected or html
+                assert html == expected, "output mismatch"
+        for memo in modes:
+            print(
+                "%-8s %-6s %10.3f %8.2fx %8.0f%%"
+                % (name, memo, best[memo], best[False] / best[memo], hit[memo] * 100)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+r"""
+节点树内存基准：用tracemalloc统计解析后节点树常驻的内存与解析过程中的峰值
+
+运行（仓库根目录）：
+>>> python -m bench.bench_memory --mb 50
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from bench.bench_incremental import make_document
+from m2h.config import Config
+from m2h.mdNode import LineFeeder, MarkDownNode
+
+
+def make_corpus(mb: float) -> str:
+    r"""
+    生成约`mb`兆字节的混合文档
+    """
+    lines = make_document(1000)
+    block = "\n".join(lines) + "\n"
+    return block * max(1, int(mb * 1e6 / len(block)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=5.0)
+    args = parser.parse_args()
+
+    text = make_corpus(args.mb)
+    config = Config()
+    gc.collect()
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    root = MarkDownNode(
+        tag=config.get("markdown_tag"), attr=config.get("markdown_attr"), config=config
+    )
+    feeder = LineFeeder(root)
+    for line in text.split("\n"):
+        feeder.feed(line)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    size = len(text.encode("utf-8"))
+    tree = current - base
+    print("source        %10.2f MB" % (size / 1e6))
+    print("tree          %10.2f MB  (%.1fx source)" % (tree / 1e6, tree / size))
+    print("parse peak    %10.2f MB" % ((peak - base) / 1e6))
+    print("parse time    %10.2f s" % elapsed)
+    del root, feeder
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+r"""
+单篇文档并行转换基准：convert_parallel 在不同进程数下相对串行 convert 的加速比
+
+运行（仓库根目录）：
+>>> python -m bench.bench_parallel --mb 16 --workers 1 2 4 8 16
+进程池在计时前创建并预热，计时只包含切分、分段解析与拼接
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench.generators import mixed
+from m2h.config import Config
+from m2h.parallel import convert_parallel
+from md import MarkDown
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=16.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    text = mixed(int(args.mb * (1 << 20)))
+    config = Config()
+
+    start = time.perf_counter()
+    expected = MarkDown(config).convert(text)
+    t_serial = time.perf_counter() - start
+
+    print("cpus %d, input %.1f MB" % (os.cpu_count() or 1, len(text) / 1e6))
+    print("%8s %10s %9s" % ("workers", "seconds", "speedup"))
+    print("%8s %10.2f %8.2fx" % ("serial", t_serial, 1.0))
+    for workers in args.workers:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # 预热：启动全部工作进程
+            list(pool.map(abs, range(workers * 4)))
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                html = convert_parallel(config, text, workers, pool)
+                best = min(best, time.perf_counter() - start)
+            assert html == expected, "output mismatch"
+        print("%8d %10.2f %8.2fx" % (workers, best, t_serial / best))
+
+
+if __name__ == "__main__":
+    main()
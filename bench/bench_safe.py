@@ -0,0 +1,171 @@
+r"""
+安全模式基准：convert(safe_mode=True) vs convert后再用外部清理器处理一遍html
+
+运行（仓库根目录）：
+>>> python -m bench.bench_safe --mb 2
+外部清理器优先使用已安装的bleach，否则使用下方基于标准库html.parser的白名单清理器；
+后者只做最少的工作（解析、按白名单保留标签与属性、检查地址、重新转义），
+比bleach等完整实现更快，比较结果偏保守
+"""
+import argparse
+import html
+import random
+import time
+from html.parser import HTMLParser
+
+from bench.generators import mixed
+from m2h.config import Config
+from m2h.template import SAFE_SCHEMES, URL_IGNORED, URL_SCHEME
+from md import MarkDown
+
+ALLOWED_TAGS = {
+    "div": {"class"},
+    "h1": set(),
+    "h2": set(),
+    "h3": set(),
+    "h4": set(),
+    "h5": set(),
+    "h6": set(),
+    "ul": set(),
+    "ol": set(),
+    "li": set(),
+    "b": set(),
+    "i": set(),
+    "a": {"href"},
+    "img": {"src", "alt"},
+    "code": {"class"},
+    "pre": {"class", "language"},
+    "script": {"type"},
+    "blockquote": set(),
+    "table": set(),
+    "tr": set(),
+    "th": {"align"},
+    "td": {"align"},
+    "hr": set(),
+    "br": set(),
+}
+VOID_TAGS = {"img", "hr", "br"}
+
+# 混入正文的不安全片段
+HOSTILE = (
+    "<script>alert(1)</script>",
+    "<img src=x onerror=alert(1)>",
+    "[click](javascript:alert(1))",
+    '![x](data:image/svg+xml,"<svg>")',
+    "a < b && c > d",
+    '"quoted" & <b>bold</b>',
+)
+
+
+class Sanitizer(HTMLParser):
+    r"""
+    白名单清理器：不在白名单中的标签丢弃（文本保留并转义），属性按标签过滤，地址检查协议
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+
+    def _attrs(self, tag, attrs):
+        allowed = ALLOWED_TAGS[tag]
+        out = []
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in ("href", "src"):
+                m = URL_SCHEME.match(URL_IGNORED.sub("", value))
+                if m is not None and m.group(1).lower() not in SAFE_SCHEMES:
+                    continue
+            out.append(' %s="%s"' % (name, html.escape(value)))
+        return "".join(out)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ALLOWED_TAGS:
+            end = "/>" if tag in VOID_TAGS else ">"
+            self.parts.append("<%s%s%s" % (tag, self._attrs(tag, attrs), end))
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in ALLOWED_TAGS:
+            self.parts.append("<%s%s/>" % (tag, self._attrs(tag, attrs)))
+
+    def handle_endtag(self, tag):
+        if tag in ALLOWED_TAGS and tag not in VOID_TAGS:
+            self.parts.append("</%s>" % tag)
+
+    def handle_data(self, data):
+        self.parts.append(html.escape(data, quote=False))
+
+
+def stdlib_clean(text: str) -> str:
+    parser = Sanitizer()
+    parser.feed(text)
+    parser.close()
+    return "".join(parser.parts)
+
+
+def external_sanitizer():
+    try:
+        import bleach
+    except ImportError:
+        return "html.parser", stdlib_clean
+    attrs = {tag: sorted(names) for tag, names in ALLOWED_TAGS.items()}
+
+    def clean(text):
+        return bleach.clean(
+            text, tags=set(ALLOWED_TAGS), attributes=attrs, protocols=SAFE_SCHEMES
+        )
+
+    return "bleach", clean
+
+
+def hostile_document(size: int, seed: int = 0) -> str:
+    r"""
+    混合文档，每隔若干行插入一个不安全片段
+    """
+    rnd = random.Random(seed)
+    lines = mixed(size, seed).split("\n")
+    for i in range(0, len(lines), 7):
+        if lines[i] and not lines[i].startswith(("```", "$$", "|")):
+            lines[i] += " " + rnd.choice(HOSTILE)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=2.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    text = hostile_document(int(args.mb * (1 << 20)))
+    name, clean = external_sanitizer()
+    plain = MarkDown(Config(inline_memo=False))
+    safe = MarkDown(Config(inline_memo=False, safe_mode=True))
+    print("input %.1f MB, external sanitizer: %s" % (len(text) / 1e6, name))
+
+    cases = {
+        "convert": lambda: plain.convert(text),
+        "convert + sanitizer": lambda: clean(plain.convert(text)),
+        "convert safe_mode": lambda: safe.convert(text),
+    }
+    best = dict.fromkeys(cases, float("inf"))
+    # 交替运行取最小值，减小机器负载波动的影响
+    for _ in range(args.repeat):
+        for case, run in cases.items():
+            start = time.process_time()
+            run()
+            best[case] = min(best[case], time.process_time() - start)
+
+    base = best["convert"]
+    for case, seconds in best.items():
+        extra = (seconds / base - 1) * 100
+        print("%-20s %8.3fs  (%+.1f%% over convert)" % (case, seconds, extra))
+    safe_extra = best["convert safe_mode"] - base
+    sanitizer_extra = best["convert + sanitizer"] - base
+    print(
+        "safe_mode overhead is %.1f%% of the sanitizer overhead"
+        % (safe_extra / sanitizer_extra * 100)
+    )
+
+
+if __name__ == "__main__":
+    main()
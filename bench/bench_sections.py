@@ -0,0 +1,75 @@
+r"""
+章节索引基准：构建索引相对convert的额外开销，以及按索引只转换一个章节 vs 转换整篇
+
+运行（仓库根目录）：
+>>> python -m bench.bench_sections --mb 8 --sections 200
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bench.generators import mixed
+from m2h.sections import SectionIndex
+from md import MarkDown
+
+
+def make_document(mb: float, sections: int) -> str:
+    r"""
+    `sections`个二级标题，各章节为大小相近的混合内容
+    """
+    size = int(mb * (1 << 20) / sections)
+    parts = []
+    for i in range(sections):
+        parts.append("## Section %d\n\n%s\n" % (i, mixed(size, seed=i)))
+    return "\n".join(parts)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=8.0)
+    parser.add_argument("--sections", type=int, default=200)
+    args = parser.parse_args()
+
+    text = make_document(args.mb, args.sections)
+    print("input %.1f MB, %d sections" % (len(text) / 1e6, args.sections))
+
+    _, t_convert = timed(MarkDown().convert, text)
+    index, t_index = timed(MarkDown().build_index, text)
+    print("convert             %8.3fs" % t_convert)
+    print(
+        "build_index         %8.3fs  (%+.1f%%, %d links, %d images)"
+        % (
+            t_index,
+            (t_index / t_convert - 1) * 100,
+            len(index.links),
+            len(index.images),
+        )
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "doc.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        index = SectionIndex.from_file(path)
+        index.save(path + ".json")
+
+        slug = index.sections[len(index.sections) // 2].slug
+        start = time.perf_counter()
+        html = MarkDown().convert_section(SectionIndex.load(path + ".json"), slug)
+        t_section = time.perf_counter() - start
+        assert html == MarkDown().convert_section(text, slug, index)
+        print(
+            "convert_section     %8.3fs  (%.0fx faster than convert, incl. index load)"
+            % (t_section, t_convert / t_section)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+r"""
+常驻服务延迟基准：每篇文档启动一个python进程转换 vs 交给常驻服务转换
+
+运行（仓库根目录）：
+>>> python -m bench.bench_server --docs 50 --kb 4 --workers 2
+依次测量：
+- 每篇一个进程，进程内导入并转换（静态站点构建、git钩子的现状）
+- 每篇一个进程，只导入客户端，交给服务转换
+- 同一进程内的客户端逐篇请求，以及同一连接上流水线批量请求
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.generators import mixed
+from m2h.client import RenderClient
+from md import MarkDown
+
+CONVERT_SCRIPT = (
+    "import sys; from md import MarkDown; "
+    "sys.stdout.write(MarkDown().convert(sys.stdin.read()))"
+)
+CLIENT_SCRIPT = (
+    "import sys; from m2h.client import RenderClient; "
+    "sys.stdout.write(RenderClient(sys.argv[1]).render(sys.stdin.read()))"
+)
+
+
+def percentiles(latencies: list) -> str:
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return "p50 %8.2fms  p99 %8.2fms" % (
+        statistics.median(latencies) * 1e3,
+        p99 * 1e3,
+    )
+
+
+def per_process(args: list, texts: list, expected: list) -> list:
+    latencies = []
+    for text, html in zip(texts, expected):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", *args],
+            input=text.encode("utf-8"),
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        latencies.append(time.perf_counter() - start)
+        assert result.stdout.decode("utf-8") == html
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--kb", type=float, default=4.0)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    texts = [mixed(int(args.kb * 1024), seed=i) for i in range(args.docs)]
+    expected = [MarkDown().convert(text) for text in texts]
+    print("%d documents of %.1f KB" % (args.docs, args.kb))
+
+    latencies = per_process([CONVERT_SCRIPT], texts, expected)
+    print("process + convert      %s" % percentiles(latencies))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "m2h.sock")
+        command = [sys.executable, "-m", "m2h", "--serve", path]
+        server = subprocess.Popen(
+            command + ["--workers", str(args.workers)], stderr=subprocess.DEVNULL
+        )
+        try:
+            while not os.path.exists(path):
+                time.sleep(0.01)
+
+            latencies = per_process([CLIENT_SCRIPT, path], texts, expected)
+            print("process + client       %s" % percentiles(latencies))
+
+            with RenderClient(path) as client:
+                latencies = []
+                for text, html in zip(texts, expected):
+                    start = time.perf_counter()
+                    assert client.render(text) == html
+                    latencies.append(time.perf_counter() - start)
+                print("client, sequential     %s" % percentiles(latencies))
+
+                start = time.perf_counter()
+                assert client.render_many(texts) == expected
+                elapsed = time.perf_counter() - start
+                print(
+                    "client, pipelined      %8.2fms per document"
+                    % (elapsed / len(texts) * 1e3)
+                )
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
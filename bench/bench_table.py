@@ -0,0 +1,83 @@
+r"""
+大表格基准：数据导出风格的长表格，convert 与 convert_stream 的耗时、行速与峰值内存
+
+运行（仓库根目录）：
+>>> python -m bench.bench_table --rows 100000
+峰值内存由tracemalloc统计，与计时分开运行
+"""
+import argparse
+import gc
+import io
+import random
+import time
+import tracemalloc
+
+from md import MarkDown
+
+STATUS = (
+    "`null`",
+    "**ok**",
+    "*pending*",
+    "failed",
+    "a \\| b",
+    "[log](https://example.com)",
+)
+
+
+def export_table(rows: int, cols: int = 6, seed: int = 0) -> str:
+    r"""
+    首列为递增id，数值列与少量取值重复的状态列交替，分隔行标注了各列对齐
+    """
+    rnd = random.Random(seed)
+    aligns = (":---", ":---:", "---:", "---")
+    lines = [
+        "| " + " | ".join("col%d" % c for c in range(cols)) + " |",
+        "|" + "|".join(aligns[c % 4] for c in range(cols)) + "|",
+    ]
+    for i in range(rows):
+        cells = [str(i)]
+        for c in range(1, cols):
+            if c % 2:
+                cells.append("%.3f" % rnd.random())
+            else:
+                cells.append(rnd.choice(STATUS))
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def convert(text: str) -> int:
+    return len(MarkDown().convert(text))
+
+
+def stream(text: str) -> int:
+    return sum(map(len, MarkDown().convert_stream(io.StringIO(text))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--cols", type=int, default=6)
+    args = parser.parse_args()
+
+    text = export_table(args.rows, args.cols)
+    print("rows %d, input %.1f MB" % (args.rows, len(text) / 1e6))
+    print("%-8s %10s %12s %10s" % ("mode", "seconds", "rows/s", "peak MB"))
+    for name, func in (("convert", convert), ("stream", stream)):
+        gc.collect()
+        start = time.perf_counter()
+        func(text)
+        elapsed = time.perf_counter() - start
+
+        gc.collect()
+        tracemalloc.start()
+        func(text)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            "%-8s %10.2f %12.0f %10.1f"
+            % (name, elapsed, args.rows / elapsed, peak / 1e6)
+        )
+
+
+if __name__ == "__main__":
+    main()
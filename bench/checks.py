@@ -0,0 +1,204 @@
+r"""
+行为检查：golden语料逐字节比对之外、需要断言的行为，每个`check_*`函数一项
+
+>>> python -m bench.checks                  # 全部检查
+>>> python -m bench.checks table_padding    # 只跑指定的检查
+"""
+import argparse
+import gc
+import re
+import sys
+import traceback
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.generators import mixed
+from m2h.cache import RenderCache
+from m2h.compiler import TABLE_MAX_COLUMNS
+from m2h.config import Config
+from m2h.template import render_tag
+from md import MarkDown
+
+ROW = re.compile(r"<tr>(.*?)</tr>")
+CELL = re.compile(r"<t[hd][ >]")
+
+
+def table_rows(html: str) -> list:
+    r"""
+    :return list --各表格行的单元格数
+    """
+    return [len(CELL.findall(row)) for row in ROW.findall(html)]
+
+
+def check_table_padding():
+    r"""
+    列数很多的表头后跟大量短行：每一行都补齐到表头的列数；列数超过上限时不开启表格
+    """
+    for cols, rows in ((10, 3000), (TABLE_MAX_COLUMNS, 500)):
+        text = "\n".join(
+            ["|" + "|".join("h%d" % i for i in range(cols)) + "|"]
+            + ["|" + "|".join(["---"] * cols) + "|"]
+            + ["|x|"] * rows
+        )
+        widths = table_rows(MarkDown().convert(text))
+        assert len(widths) == rows + 1, (cols, len(widths))
+        assert set(widths) == {cols}, (cols, sorted(set(widths)))
+
+    cols = TABLE_MAX_COLUMNS + 1
+    text = "\n".join(
+        ["|" + "|".join("h%d" % i for i in range(cols)) + "|"]
+        + ["|" + "|".join(["---"] * cols) + "|"]
+        + ["|x|"] * 10
+    )
+    assert "<table>" not in MarkDown().convert(text)
+
+
+def check_tag_cache():
+    r"""
+    开始标签缓存按渲染后的属性区分：`True`、`1`、`1.0`相等且哈希相同，标签各不相同
+    """
+    for end in (">", "/>"):
+        rendered = [
+            render_tag("td", {"colspan": value}, end) for value in (True, 1, 1.0, "1")
+        ]
+        assert rendered == [
+            '<td colspan="True"%s' % end,
+            '<td colspan="1"%s' % end,
+            '<td colspan="1.0"%s' % end,
+            '<td colspan="1"%s' % end,
+        ], rendered
+
+    config = Config(code_attr={"class": "codehilite", "data-n": 1})
+    other = Config(code_attr={"class": "codehilite", "data-n": True})
+    assert 'data-n="1"' in MarkDown(config).convert("`x`")
+    assert 'data-n="True"' in MarkDown(other).convert("`x`")
+
+
+def check_table_stats():
+    r"""
+    性能统计计入表格单元格的内嵌解析：调用次数与各种标识的命中数
+    """
+    text = "| a | b |\n|---|---|\n| `c` | d |\n| *e* | [f](u) |\n| plain | x |"
+    for safe in (False, True):
+        md = MarkDown(Config(safe_mode=safe))
+        md.convert(text, profile=True)
+        stats = md.get_stats().to_dict()
+        # 三个带标识的单元格，另有表头行在读到分隔行之前按普通文本解析的一次
+        assert stats["functions"]["extract_inline"]["calls"] == 4, stats["functions"]
+        assert stats["inline_matches"] == {
+            "code": 1,
+            "italic_star": 1,
+            "link_href": 1,
+        }, stats["inline_matches"]
+
+
+def check_concurrent_configs():
+    r"""
+    不同配置的多个`MarkDown`在线程池中并发转换（同一实例也被多个线程同时使用），
+    以及`convert_many`的线程池与进程池：结果均与各自串行转换一致
+    """
+    configs = [
+        Config(),
+        Config(
+            markdown_tag="article",
+            code_tag="code-block",
+            comment_tag="aside",
+            formula_tag="math",
+            code_attr={"class": "hl"},
+        ),
+        Config(markdown_attr={"id": "doc"}, safe_mode=True),
+    ]
+    docs = [mixed(8 << 10, seed) for seed in range(8)]
+    expected = {
+        (i, j): MarkDown(config).convert(text)
+        for i, config in enumerate(configs)
+        for j, text in enumerate(docs)
+    }
+    # 各配置的输出互不相同，配置串用时能被发现
+    for j in range(len(docs)):
+        assert len({expected[i, j] for i in range(len(configs))}) == len(configs)
+
+    mds = [MarkDown(config) for config in configs]
+    jobs = [
+        (i, j) for _ in range(4) for i in range(len(configs)) for j in range(len(docs))
+    ]
+
+    def run(job):
+        i, j = job
+        return job, mds[i].convert(docs[j])
+
+    with ThreadPoolExecutor(8) as pool:
+        for job, html in pool.map(run, jobs):
+            assert html == expected[job], job
+    for i, md in enumerate(mds):
+        assert md.get_html() in [expected[i, j] for j in range(len(docs))], i
+        want = [expected[i, j] for j in range(len(docs))]
+        assert md.convert_many(docs, workers=4) == want, i
+        assert md.convert_many(docs, workers=2, process=True) == want, i
+
+
+def check_cache_bytes():
+    r"""
+    渲染缓存的内存占用不超过`max_bytes`（不保留节点树）；命中后dom树按需重建，与未命中时一致
+    """
+    max_bytes = 1 << 20
+    docs = [mixed(32 << 10, seed) for seed in range(64)]
+    cache = RenderCache(max_bytes=max_bytes)
+    md = MarkDown(cache=cache)
+    # 首次转换时的惰性导入与编译不计入
+    MarkDown().convert(docs[0] + "\n")
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for text in docs:
+            md.convert(text)
+        # 丢弃实例持有的最后一棵节点树；节点树带父节点引用，需由gc回收
+        md = MarkDown(cache=cache)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    stats = cache.stats()
+    assert stats["evictions"] > 0 and stats["bytes"] <= max_bytes, stats
+    # 另有条目与键的少量开销
+    assert retained <= max_bytes * 5 // 4, (retained, stats)
+
+    fresh = MarkDown()
+    expected = fresh.convert(docs[-1])
+    assert md.convert(docs[-1]) == expected
+    assert cache.stats()["hits"] == 1
+    assert md.get_dom_tree() == fresh.get_dom_tree()
+
+
+def checks() -> dict:
+    return {
+        name[len("check_") :]: func
+        for name, func in sorted(globals().items())
+        if name.startswith("check_")
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("names", nargs="*", help="检查名，缺省时全部运行")
+    args = parser.parse_args(argv)
+
+    available = checks()
+    names = args.names or list(available)
+    failures = []
+    for name in names:
+        try:
+            available[name]()
+        except Exception:
+            failures.append(name)
+            print("FAIL %s" % name)
+            traceback.print_exc()
+        else:
+            print("ok   %s" % name)
+    print("%d/%d checks passed" % (len(names) - len(failures), len(names)))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
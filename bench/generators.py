@@ -0,0 +1,144 @@
+r"""
+基准用的合成文档生成器：每种语法一个生成器，以及按比例混合的真实风格文档
+
+每个生成器签名均为`gen(size, seed=0) -> str`，输出约`size`字节（utf-8）的markdown文本
+"""
+import random
+
+WORDS = (
+    "markdown html parser node tree table list code formula quote render "
+    "stream cache config block inline token line level indent 转换 解析 节点"
+).split()
+
+
+def _words(rnd: random.Random, n: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(n))
+
+
+def _inline(rnd: random.Random, n: int) -> str:
+    r"""
+    带内嵌标识的一行文本
+    """
+    out = []
+    for i in range(n):
+        k = rnd.randrange(12)
+        w = rnd.choice(WORDS)
+        if k == 0:
+            out.append("**%s**" % w)
+        elif k == 1:
+            out.append("*%s*" % w)
+        elif k == 2:
+            out.append("`%s()`" % w)
+        elif k == 3:
+            out.append("[%s](https://example.com/%d)" % (w, i))
+        elif k == 4:
+            out.append("$x_%d$" % i)
+        elif k == 5:
+            out.append("![%s](img/%d.png)" % (w, i))
+        else:
+            out.append(w)
+    return " ".join(out)
+
+
+def headings(rnd):
+    return ["#" * rnd.randint(1, 6) + " " + _words(rnd, rnd.randint(2, 8)), ""]
+
+
+def nested_lists(rnd):
+    lines = []
+    for _ in range(rnd.randint(2, 8)):
+        depth = rnd.randint(0, 3)
+        bullet = rnd.choice(["-", "+", "1."])
+        text = _inline(rnd, rnd.randint(3, 10))
+        lines.append("    " * depth + bullet + " " + text)
+    return lines + [""]
+
+
+def tables(rnd):
+    cols = rnd.randint(2, 6)
+    aligns = [":-", "-:", ":-:", "---"]
+    lines = [
+        "| " + " | ".join(_words(rnd, 1) for _ in range(cols)) + " |",
+        "|" + "|".join(rnd.choice(aligns) for _ in range(cols)) + "|",
+    ]
+    for _ in range(rnd.randint(2, 20)):
+        cells = [_inline(rnd, rnd.randint(1, 3)) for _ in range(cols)]
+        lines.append("| " + " | ".join(cells) + " |")
+    return lines + [""]
+
+
+def fenced_code(rnd):
+    lines = ["```" + rnd.choice(["", "python", "js", "c"])]
+    for i in range(rnd.randint(3, 30)):
+        code = "x%d = %s(%d)" % (i, rnd.choice(WORDS), i)
+        lines.append("    " * rnd.randint(0, 2) + code)
+    return lines + ["```", ""]
+
+
+def formulas(rnd):
+    lines = ["$$"]
+    for i in range(rnd.randint(1, 5)):
+        lines.append("\\sum_{i=%d}^{n} x_i^%d" % (i, rnd.randint(1, 9)))
+    return lines + ["$$", ""]
+
+
+def blockquotes(rnd):
+    lines = []
+    for _ in range(rnd.randint(1, 6)):
+        lines.append(">" * rnd.randint(1, 3) + " " + _inline(rnd, rnd.randint(3, 12)))
+    return lines + [""]
+
+
+def inline_prose(rnd):
+    return [_inline(rnd, rnd.randint(20, 80)), ""]
+
+
+def hr(rnd):
+    return ["---", ""]
+
+
+# 混合文档中各类块的权重
+MIXED_WEIGHTS = {
+    headings: 8,
+    nested_lists: 12,
+    tables: 5,
+    fenced_code: 8,
+    formulas: 2,
+    blockquotes: 5,
+    inline_prose: 58,
+    hr: 2,
+}
+
+
+def _build(blocks, weights, size: int, seed: int) -> str:
+    rnd = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        block = rnd.choices(blocks, weights)[0](rnd)
+        lines.extend(block)
+        total += sum(len(line.encode("utf-8")) + 1 for line in block)
+    return "\n".join(lines)
+
+
+def single(block):
+    r"""
+    只包含一种语法的文档生成器
+    """
+
+    def gen(size: int, seed: int = 0) -> str:
+        return _build([block], [1], size, seed)
+
+    gen.__name__ = block.__name__
+    return gen
+
+
+def mixed(size: int, seed: int = 0) -> str:
+    r"""
+    按`MIXED_WEIGHTS`比例混合各类块，近似真实文档
+    """
+    return _build(list(MIXED_WEIGHTS), list(MIXED_WEIGHTS.values()), size, seed)
+
+
+GENERATORS = {block.__name__: single(block) for block in MIXED_WEIGHTS}
+GENERATORS["mixed"] = mixed
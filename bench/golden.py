@@ -0,0 +1,68 @@
+r"""
+golden语料：bench/golden/*.md 与期望输出 *.html 逐字节比对，防止性能改动悄悄改变html
+
+>>> python -m bench.golden            # 检查
+>>> python -m bench.golden --update   # 有意改变输出后更新期望
+"""
+import argparse
+import glob
+import os
+import sys
+
+from md import MarkDown
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+
+
+def cases() -> list:
+    return sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.md")))
+
+
+def render(path: str) -> str:
+    with open(path, encoding="utf-8", newline="") as f:
+        return MarkDown().convert(f.read())
+
+
+def check() -> list:
+    r"""
+    :return list --输出与期望不一致（或缺少期望文件）的用例名
+    """
+    failures = []
+    for path in cases():
+        expected_path = os.path.splitext(path)[0] + ".html"
+        try:
+            with open(expected_path, encoding="utf-8", newline="") as f:
+                expected = f.read()
+        except OSError:
+            expected = None
+        if render(path) != expected:
+            failures.append(os.path.basename(path))
+    return failures
+
+
+def update():
+    for path in cases():
+        with open(
+            os.path.splitext(path)[0] + ".html", "w", encoding="utf-8", newline=""
+        ) as f:
+            f.write(render(path))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--update", action="store_true", help="以当前输出更新期望")
+    args = parser.parse_args(argv)
+
+    if args.update:
+        update()
+        print("updated %d cases" % len(cases()))
+        return 0
+    failures = check()
+    for name in failures:
+        print("FAIL %s" % name)
+    print("%d/%d cases passed" % (len(cases()) - len(failures), len(cases())))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+r"""
+转换热点基准：按语法与文档大小测量吞吐、峰值内存与各阶段耗时
+
+运行（仓库根目录）：
+>>> python -m bench.run --sizes 1K 100K 1M --output bench_result.json
+>>> python -m bench.run --baseline bench_baseline.json
+运行前会先检查golden语料，输出变化时直接失败
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from bench import golden
+from bench.generators import GENERATORS
+from m2h.config import Config
+from m2h.mdNode import LineFeeder, MarkDownNode
+
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(text: str) -> int:
+    unit = UNITS.get(text[-1:].upper())
+    return int(float(text[:-1]) * unit) if unit else int(text)
+
+
+def measure(text: str, repeat: int, memory: bool) -> dict:
+    r"""
+    分阶段计时：切分行、逐行解析、to_html、to_dict；各阶段取多次中的最好成绩
+    """
+    config = Config()
+    best = {}
+    for _ in range(repeat):
+        root = MarkDownNode(
+            tag=config.get("markdown_tag"),
+            attr=config.get("markdown_attr"),
+            config=config,
+        )
+        gc.collect()
+        t0 = time.perf_counter()
+        lines = text.split("\n")
+        t1 = time.perf_counter()
+        feeder = LineFeeder(root)
+        for line in lines:
+            feeder.feed(line)
+        t2 = time.perf_counter()
+        root.to_html()
+        t3 = time.perf_counter()
+        root.to_dict()
+        t4 = time.perf_counter()
+        for stage, seconds in (
+            ("split_s", t1 - t0),
+            ("parse_s", t2 - t1),
+            ("html_s", t3 - t2),
+            ("dict_s", t4 - t3),
+            ("total_s", t3 - t0),
+        ):
+            best[stage] = min(best.get(stage, seconds), seconds)
+        del root, feeder, lines
+
+    nbytes = len(text.encode("utf-8"))
+    result = {"bytes": nbytes, **best}
+    result["mb_per_s"] = nbytes / 1e6 / best["total_s"]
+
+    if memory:
+        # tracemalloc本身较慢，单独跑一次只统计峰值
+        gc.collect()
+        tracemalloc.start()
+        root = MarkDownNode(
+            tag=config.get("markdown_tag"),
+            attr=config.get("markdown_attr"),
+            config=config,
+        )
+        root.convert(text)
+        result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        del root
+    return result
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    r"""
+    与基线比较总耗时，返回超过阈值的退化项
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        ratio = result["total_s"] / base["total_s"]
+        mark = ""
+        if ratio > 1 + threshold:
+            regressions.append(key)
+            mark = "  REGRESSION"
+        print("%-24s %8.2fx vs baseline%s" % (key, ratio, mark))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--generators", nargs="+", default=list(GENERATORS), choices=list(GENERATORS)
+    )
+    parser.add_argument("--sizes", nargs="+", default=["1K", "100K", "1M"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="不统计峰值内存")
+    parser.add_argument("--output", default=None, help="结果json的保存路径")
+    parser.add_argument("--baseline", default=None, help="用于比较的基线json")
+    parser.add_argument("--threshold", type=float, default=0.1, help="允许的退化比例")
+    parser.add_argument("--skip-golden", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not args.skip_golden:
+        failures = golden.check()
+        if failures:
+            print("golden output changed: %s" % ", ".join(failures), file=sys.stderr)
+            return 1
+
+    results = {}
+    print(
+        "%-24s %10s %9s %9s %9s %9s %9s %9s"
+        % ("case", "bytes", "split", "parse", "html", "dict", "MB/s", "peak MB")
+    )
+    for name in args.generators:
+        for size_text in args.sizes:
+            size = parse_size(size_text)
+            text = GENERATORS[name](size)
+            # 大文档只跑一次
+            repeat = args.repeat if size <= (8 << 20) else 1
+            result = measure(text, repeat, not args.no_memory)
+            key = "%s/%s" % (name, size_text)
+            results[key] = result
+            print(
+                "%-24s %10d %8.1fms %8.1fms %8.1fms %8.1fms %9.2f %9s"
+                % (
+                    key,
+                    result["bytes"],
+                    result["split_s"] * 1e3,
+                    result["parse_s"] * 1e3,
+                    result["html_s"] * 1e3,
+                    result["dict_s"] * 1e3,
+                    result["mb_per_s"],
+                    "%.1f" % result["peak_mb"] if "peak_mb" in result else "-",
+                )
+            )
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import sys
+
+from m2h.cli import main
+
+sys.exit(main())
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from m2h.mdNode import LineFeeder, MarkDownNode
+
+# 工作线程中每解析该数量的行检查一次取消标记
+CHECK_LINES = 256
+
+
+class ConversionCancelled(Exception):
+    r"""
+    转换在工作线程中因请求取消或超时而中止
+    """
+
+
+class _YieldingWriter:
+    r"""
+    `to_html(out=...)`的写入目标：收集分批写入的html，每批之后让出一次GIL
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, html: str):
+        self.parts.append(html)
+        time.sleep(0)
+
+
+def convert_cancellable(root: MarkDownNode, markdown_text: str, cancel) -> str:
+    r"""
+    与`MarkDownNode.convert`相同，但定期检查取消标记，供工作线程调用
+    每次检查以及输出html的每一批之后让出GIL：否则事件循环线程醒来后要等到
+    解释器的切换间隔（默认5ms）才能运行
+    :param cancel --threading.Event，被设置后在下一次检查时抛出`ConversionCancelled`
+    """
+    feeder = LineFeeder(root)
+    for i, text in enumerate(markdown_text.split("\n")):
+        if not i % CHECK_LINES:
+            if cancel.is_set():
+                raise ConversionCancelled()
+            time.sleep(0)
+        feeder.feed(text)
+    out = _YieldingWriter()
+    root.to_html(out=out)
+    return "".join(out.parts)
+
+
+class AsyncExecutor:
+    r"""
+    asyncio转换使用的有界执行器：大文档交给固定大小的线程池（或进程池），同时进行的
+    转换数受并发上限约束，超出的请求在事件循环中排队等待
+    可在多个事件循环中共用，并发上限按事件循环分别计算
+    线程池中的转换与事件循环争用GIL，节点树也由事件循环所在进程的gc扫描；
+    对延迟敏感的服务可改用进程池，代价是输入与html在进程间复制
+
+    :example
+    >>> executor = AsyncExecutor(max_workers=4, max_concurrency=32)
+    >>> md = MarkDown(executor=executor)
+    >>> html = await md.aconvert(text, timeout=2.0)
+    >>> executor = AsyncExecutor(max_workers=4, processes=True)
+    """
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        max_concurrency: int = None,
+        offload_size: int = 8 << 10,
+        time_slice: float = 0.002,
+        processes: bool = False,
+    ):
+        r"""
+        :param max_workers --工作线程数（或进程数），默认min(4, cpu数)
+        :param max_concurrency --同时进行的转换数上限，默认为工作线程数的4倍
+        :param offload_size --不小于该字符数的文本交给线程池，更小的直接在事件循环中转换；
+            默认值对应约2ms的解析
+        :param time_slice --流式转换在事件循环中连续解析的最长秒数，之后让出一次；
+            同一事件循环中同时进行的流式转换共同分享
+        :param processes --为True时使用进程池：转换不再与事件循环争用GIL，
+            但已开始的转换不能中途取消，取消或超时后仍会在工作进程中完成
+        """
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_concurrency = max_concurrency or self.max_workers * 4
+        self.offload_size = offload_size
+        self.time_slice = time_slice
+        self.processes = processes
+        if processes:
+            self._pool = ProcessPoolExecutor(self.max_workers)
+        else:
+            self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="m2h")
+        self._semaphores = weakref.WeakKeyDictionary()
+        # 事件循环 -> 正在进行的流式转换数
+        self._streams = weakref.WeakKeyDictionary()
+
+    def limit(self) -> asyncio.Semaphore:
+        r"""
+        当前事件循环的并发上限，`async with executor.limit():`
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(
+                self.max_concurrency
+            )
+        return semaphore
+
+    @contextmanager
+    def streaming(self):
+        r"""
+        登记一个正在当前事件循环中进行的流式转换，`with executor.streaming():`
+        """
+        loop = asyncio.get_running_loop()
+        self._streams[loop] = self._streams.get(loop, 0) + 1
+        try:
+            yield
+        finally:
+            self._streams[loop] -= 1
+
+    def stream_slice(self) -> float:
+        r"""
+        每个流式转换连续解析的秒数：`time_slice`由当前事件循环中同时进行的流式转换均分，
+        事件循环处理其他任务的间隔不随流式转换的并发数增长
+        """
+        streams = self._streams.get(asyncio.get_running_loop(), 0)
+        return self.time_slice / max(streams, 1)
+
+    async def run(self, func, *args):
+        r"""
+        在线程池中执行`func(*args, cancel)`；等待方被取消（含超时）时设置取消标记，
+        工作线程随后在下一次检查时中止
+        使用进程池时执行`func(*args)`，取消只对尚未开始的任务有效
+        """
+        loop = asyncio.get_running_loop()
+        if self.processes:
+            return await loop.run_in_executor(self._pool, func, *args)
+        cancel = threading.Event()
+        try:
+            return await loop.run_in_executor(self._pool, func, *args, cancel)
+        except BaseException:
+            cancel.set()
+            raise
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_executor() -> AsyncExecutor:
+    r"""
+    进程内共享的默认执行器，首次使用时创建
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AsyncExecutor()
+        return _default
+
+
+async def aiter_lines(lines):
+    r"""
+    将异步或同步的行迭代器统一为异步迭代器
+    """
+    if hasattr(lines, "__aiter__"):
+        async for line in lines:
+            yield line
+    else:
+        for line in lines:
+            yield line
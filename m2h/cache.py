@@ -0,0 +1,172 @@
+import hashlib
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+from m2h.config import Config
+
+
+class RenderCache:
+    r"""
+    转换结果缓存：以输入文本与配置的哈希为键，内存中按LRU淘汰，可选sqlite持久化
+    内存与磁盘都只保存html，占用由`max_bytes`限定；命中后需要dom树时由调用方重新解析
+
+    :example
+    >>> from m2h.cache import RenderCache
+    >>> cache = RenderCache(max_entries=4096, max_bytes=64 << 20, path="m2h.sqlite")
+    >>> md = MarkDown(cache=cache)
+    >>> md.convert(text)
+    >>> cache.stats()
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 << 20,
+        path: str = None,
+        disk_max_entries: int = None,
+    ):
+        r"""
+        :param max_entries --内存中最多保存的条目数
+        :param max_bytes --内存中html的总大小上限（字节），即内存缓存的全部占用
+        :param path --sqlite文件路径，为None时只使用内存
+        :param disk_max_entries --磁盘中最多保存的条目数，为None时不限制
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_max_entries = disk_max_entries
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS render_html ("
+                "key TEXT PRIMARY KEY, html TEXT NOT NULL, atime INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS render_html_atime ON render_html (atime)"
+            )
+            self._db.commit()
+            self._clock = self._db.execute(
+                "SELECT COALESCE(MAX(atime), 0) FROM render_html"
+            ).fetchone()[0]
+
+    @staticmethod
+    def make_key(markdown_text: str, config: Config) -> str:
+        r"""
+        缓存键：配置指纹与输入文本的sha256
+        """
+        h = hashlib.sha256(config.fingerprint().encode("utf-8"))
+        h.update(b"\0")
+        h.update(markdown_text.encode("utf-8", "surrogatepass"))
+        return h.hexdigest()
+
+    def get(self, key: str):
+        r"""
+        :return str --缓存的html，未命中时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT html FROM render_html WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._clock += 1
+                    self._db.execute(
+                        "UPDATE render_html SET atime = ? WHERE key = ?",
+                        (self._clock, key),
+                    )
+                    self._db.commit()
+                    html = row[0]
+                    self._store(key, html)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return html
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, html: str):
+        with self._lock:
+            self._store(key, html)
+            if self._db is not None:
+                self._clock += 1
+                self._db.execute(
+                    "INSERT OR REPLACE INTO render_html VALUES (?, ?, ?)",
+                    (key, html, self._clock),
+                )
+                if self.disk_max_entries is not None:
+                    self._db.execute(
+                        "DELETE FROM render_html WHERE key IN ("
+                        "SELECT key FROM render_html ORDER BY atime DESC "
+                        "LIMIT -1 OFFSET ?)",
+                        (self.disk_max_entries,),
+                    )
+                self._db.commit()
+
+    def _store(self, key: str, html: str):
+        r"""
+        写入内存并按LRU淘汰，调用方需持有锁
+        """
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        nbytes = sys.getsizeof(html)
+        if nbytes > self.max_bytes:
+            return
+        self._entries[key] = (html, nbytes)
+        self._bytes += nbytes
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted[1]
+            self.evictions += 1
+
+    def clear(self):
+        r"""
+        清空内存与磁盘中的全部条目，计数器保持不变
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM render_html")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        r"""
+        命中、未命中、淘汰计数与当前占用
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_hits": self.disk_hits,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
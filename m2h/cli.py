@@ -0,0 +1,184 @@
+r"""
+命令行批量转换：遍历目录，将.md文件分块交给进程池，在源文件旁写出.html
+`--serve`时改为启动常驻转换服务，见`m2h.server`
+
+>>> python -m m2h docs/ --workers 8 --dom
+>>> python -m m2h --serve /tmp/m2h.sock --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from m2h.config import Config
+
+MANIFEST_NAME = ".m2h-manifest.json"
+
+
+def iter_markdown_files(root: str, exts: tuple):
+    r"""
+    遍历目录下的markdown文件，`root`为单个文件时直接返回
+    """
+    if os.path.isfile(root):
+        yield root
+        return
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith(exts):
+                yield os.path.join(dirpath, name)
+
+
+def load_manifest(path: str) -> dict:
+    r"""
+    读取清单：{相对路径: [mtime_ns, size, 选项指纹]}，不存在或损坏时返回空清单
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path: str, manifest: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=0, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def options_fingerprint(config: Config, dom: bool) -> str:
+    r"""
+    影响输出的选项的指纹，记入清单；选项改变后已转换的文件也重新转换
+    """
+    options = json.dumps([config.fingerprint(), dom])
+    return hashlib.sha1(options.encode("utf-8")).hexdigest()[:16]
+
+
+def convert_files(config_kwargs: dict, paths: list, dom: bool) -> list:
+    r"""
+    进程池任务：转换一组文件，返回[(路径, 输入字节数, 错误信息或None)]
+    单个文件读写或转换出错时记录错误，继续转换其余文件
+    """
+    from md import MarkDown
+
+    md = MarkDown(Config(**config_kwargs))
+    results = []
+    for path in paths:
+        try:
+            # 去掉可能存在的BOM
+            with open(path, encoding="utf-8-sig") as f:
+                text = f.read()
+            html = md.convert(text)
+            base = os.path.splitext(path)[0]
+            with open(base + ".html", "w", encoding="utf-8") as f:
+                f.write(html)
+            if dom:
+                with open(base + ".json", "w", encoding="utf-8") as f:
+                    json.dump(md.get_dom_tree(), f, ensure_ascii=False)
+            results.append((path, len(text.encode("utf-8")), None))
+        except (OSError, UnicodeDecodeError) as e:
+            results.append((path, 0, str(e)))
+        except Exception as e:
+            results.append((path, 0, "%s: %s" % (type(e).__name__, e)))
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m m2h", description="批量将markdown文件转换为html"
+    )
+    parser.add_argument("path", nargs="?", help="markdown文件或目录")
+    parser.add_argument(
+        "--serve", metavar="SOCKET", default=None, help="在unix域套接字上启动常驻服务"
+    )
+    parser.add_argument("--workers", type=int, default=None, help="进程数")
+    parser.add_argument(
+        "--chunk-size", type=int, default=16, help="每个任务的文件数"
+    )
+    parser.add_argument("--dom", action="store_true", help="同时写出dom树json")
+    parser.add_argument("--config", default=None, help="Config参数的json文件")
+    parser.add_argument(
+        "--ext", nargs="+", default=[".md", ".markdown"], help="markdown文件后缀"
+    )
+    parser.add_argument("--manifest", default=None, help="增量清单路径")
+    parser.add_argument(
+        "--force", action="store_true", help="忽略清单，全部重新转换"
+    )
+    args = parser.parse_args(argv)
+    if (args.path is None) == (args.serve is None):
+        parser.error("either a path or --serve is required")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    config_kwargs = {}
+    if args.config is not None:
+        with open(args.config, encoding="utf-8-sig") as f:
+            config_kwargs = json.load(f)
+
+    if args.serve is not None:
+        from m2h.server import serve
+
+        return serve(args.serve, args.workers, config_kwargs)
+
+    root = args.path
+    base_dir = root if os.path.isdir(root) else os.path.dirname(root) or "."
+    manifest_path = args.manifest or os.path.join(base_dir, MANIFEST_NAME)
+    manifest = {} if args.force else load_manifest(manifest_path)
+    options = options_fingerprint(Config(**config_kwargs), args.dom)
+
+    # 跳过mtime、大小与选项均未变化的文件
+    todo, stats, skipped = [], {}, 0
+    for path in iter_markdown_files(root, tuple(args.ext)):
+        st = os.stat(path)
+        key = os.path.relpath(path, base_dir)
+        stats[key] = [st.st_mtime_ns, st.st_size, options]
+        if manifest.get(key) == stats[key]:
+            skipped += 1
+        else:
+            todo.append(path)
+
+    start = time.perf_counter()
+    done, failed, total_bytes = 0, 0, 0
+    size = args.chunk_size
+    chunks = [todo[i : i + size] for i in range(0, len(todo), size)]
+    if chunks:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [
+                executor.submit(convert_files, config_kwargs, chunk, args.dom)
+                for chunk in chunks
+            ]
+            for future in as_completed(futures):
+                for path, nbytes, error in future.result():
+                    key = os.path.relpath(path, base_dir)
+                    if error is None:
+                        done += 1
+                        total_bytes += nbytes
+                        manifest[key] = stats[key]
+                    else:
+                        failed += 1
+                        manifest.pop(key, None)
+                        print("error: %s: %s" % (path, error), file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    # 已删除的文件不再保留在清单中
+    manifest = {k: v for k, v in manifest.items() if k in stats}
+    save_manifest(manifest_path, manifest)
+
+    print(
+        "converted %d, skipped %d, failed %d in %.2fs (%.1f files/s, %.2f MB/s)"
+        % (
+            done,
+            skipped,
+            failed,
+            elapsed,
+            done / elapsed if elapsed else 0.0,
+            total_bytes / 1e6 / elapsed if elapsed else 0.0,
+        )
+    )
+    return 1 if failed else 0
@@ -0,0 +1,139 @@
+r"""
+常驻转换服务的客户端，不导入转换模块本身，启动开销只有套接字连接
+
+>>> from m2h.client import RenderClient
+>>> with RenderClient("/tmp/m2h.sock") as client:
+...     html = client.render("# title")
+...     htmls = client.render_many(texts)
+"""
+import json
+import selectors
+import socket
+
+from m2h.protocol import encode_frame, next_frame
+
+RECV_SIZE = 1 << 16
+
+# 流水线中同时在途的请求数
+PIPELINE_WINDOW = 32
+
+
+class RenderClient:
+    r"""
+    一个连接上的同步客户端：请求按流水线发送，收发交替进行，
+    不会因双方的缓冲区都已写满而互相等待
+    服务端返回的错误以ValueError抛出，连接意外关闭时抛出ConnectionError
+    """
+
+    def __init__(self, path: str, timeout: float = None):
+        r"""
+        :param path --服务端的unix域套接字路径
+        :param timeout --等待服务端收发的秒数，超时抛出TimeoutError；None为不限
+        """
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.connect(path)
+        except OSError:
+            self._sock.close()
+            raise
+        self._sock.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._sock, selectors.EVENT_READ)
+        self._timeout = timeout
+        self._next_id = 0
+        self._inbuf = bytearray()
+
+    def render(self, markdown: str, config: dict = None, dom: bool = False):
+        r"""
+        转换一篇文本
+        :param markdown --markdown文本
+        :param config --`Config`参数，为None时使用服务端的默认配置
+        :param dom --是否同时返回dom树
+        :return str | tuple --html，dom为True时为(html, dom树)
+        """
+        return self.render_many([markdown], config, dom)[0]
+
+    def render_many(
+        self, texts, config: dict = None, dom: bool = False, window=PIPELINE_WINDOW
+    ) -> list:
+        r"""
+        在同一连接上流水线转换多篇文本，结果顺序与输入一致
+        :param texts --markdown文本的可迭代对象
+        :param window --同时在途的请求数上限
+        """
+        texts = iter(texts)
+        results = []
+        errors = []
+        outbuf = bytearray()
+        first = self._next_id
+        in_flight = 0
+        exhausted = False
+        while True:
+            # 补足在途请求
+            while not exhausted and in_flight < window:
+                text = next(texts, None)
+                if text is None:
+                    exhausted = True
+                    break
+                request = {"id": self._next_id, "markdown": text, "dom": dom}
+                if config is not None:
+                    request["config"] = config
+                outbuf += encode_frame(request)
+                self._next_id += 1
+                in_flight += 1
+            if not in_flight:
+                break
+
+            events = selectors.EVENT_READ
+            if outbuf:
+                events |= selectors.EVENT_WRITE
+            self._selector.modify(self._sock, events)
+            ready = self._selector.select(self._timeout)
+            if not ready:
+                raise TimeoutError("no response from the render server")
+            mask = ready[0][1]
+
+            if mask & selectors.EVENT_WRITE:
+                try:
+                    sent = self._sock.send(outbuf)
+                except BlockingIOError:
+                    sent = 0
+                del outbuf[:sent]
+            if mask & selectors.EVENT_READ:
+                try:
+                    data = self._sock.recv(RECV_SIZE)
+                except BlockingIOError:
+                    continue
+                if not data:
+                    raise ConnectionError("render server closed the connection")
+                self._inbuf += data
+                while True:
+                    body = next_frame(self._inbuf)
+                    if body is None:
+                        break
+                    response = json.loads(body)
+                    in_flight -= 1
+                    if "error" in response:
+                        errors.append(response["error"])
+                        results.append(None)
+                    elif dom:
+                        results.append((response["html"], response["dom"]))
+                    else:
+                        results.append(response["html"])
+                    if response["id"] != first + len(results) - 1:
+                        raise ConnectionError("response out of order")
+
+        # 全部响应收齐后再抛出，连接仍可继续使用
+        if errors:
+            raise ValueError(errors[0])
+        return results
+
+    def close(self):
+        self._selector.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,379 @@
+import mmap
+import struct
+import sys
+from array import array
+
+from m2h.config import DEFAULTS, Config
+from m2h.mdNode import LineFeeder, MarkDownNode, create_root
+from m2h.template import RenderProfile, render_tag
+
+MAGIC = b"M2HT"
+FORMAT_VERSION = 1
+
+# 魔数之后的头部：版本，字符串数、属性组数、属性对数、形状数、节点数、孩子数、字符串池字符数
+HEADER = struct.Struct("<8I")
+
+# 孩子数组中最高位为1的项是字符串编号，否则是节点编号
+TEXT = 1 << 31
+# 形状标记位
+SELF_CLOSE = 1
+
+# 与配置相关的标签与内嵌片段在编译时以孤立代理字符占位，渲染时换成目标配置的取值；
+# 正常解码得到的文本不含孤立代理字符，不会与之混淆
+ROOT_ROLE = "\ud800root"
+CODE_ROLE = "\ud800code"
+FORMULA_ROLE = "\ud800formula"
+COMMENT_ROLE = "\ud800comment"
+INLINE_CODE_OPEN = "\ud801"
+INLINE_CODE_CLOSE = "\ud802"
+FORMULA_OPEN = "\ud803"
+FORMULA_CLOSE = "\ud804"
+
+
+class _SymbolicConfig:
+    r"""
+    编译时使用的配置：各包装标签为占位符，属性为空，节点只读取其`profile`
+    """
+
+    __slots__ = ("profile",)
+
+    def __init__(self):
+        values = dict(
+            DEFAULTS,
+            markdown_tag=ROOT_ROLE,
+            markdown_attr={},
+            code_tag=CODE_ROLE,
+            code_attr={},
+            formula_tag=FORMULA_ROLE,
+            formula_attr={},
+            comment_tag=COMMENT_ROLE,
+            inline_memo=False,
+        )
+        profile = RenderProfile(values)
+        profile.inline_code_open = INLINE_CODE_OPEN
+        profile.inline_code_close = INLINE_CODE_CLOSE
+        profile.formula_open = FORMULA_OPEN
+        profile.formula_close = FORMULA_CLOSE
+        self.profile = profile
+
+
+_SYMBOLIC = _SymbolicConfig()
+
+
+def _u32(data, offset: int, count: int):
+    r"""
+    缓冲区中从`offset`起的`count`个小端u32；小端平台上不复制
+    """
+    view = memoryview(data)[offset : offset + 4 * count]
+    if sys.byteorder == "little":
+        return view.cast("I")
+    values = array("I", view)
+    values.byteswap()
+    return values
+
+
+class CompiledTree:
+    r"""
+    与配置无关的已解析节点树，可序列化为紧凑的二进制格式，在任意`Config`下直接渲染
+    节点按(标签, 属性组, 层级, 标记)去重为形状，孩子平铺在一个数组中，全部字符串
+    放在同一个字符串池；载入时数组直接引用缓冲区（可为mmap），不逐节点构建对象
+    在目标配置下渲染的结果与`MarkDown(config).convert`一致；例外是`comment_tag`
+    与其他块级标签相同的配置，其解析本身依赖配置
+
+    :example
+    >>> tree = CompiledTree.from_text(md_text)
+    >>> tree.dump("doc.m2ht")
+    >>> tree = CompiledTree.load("doc.m2ht")
+    >>> html = tree.render(Config(code_tag="my-code"))
+    """
+
+    __slots__ = (
+        "_strings",
+        "_attr_sets",
+        "_attr_pairs",
+        "_shapes",
+        "_nodes",
+        "_children",
+        "_buffer",
+    )
+
+    def __init__(self, strings, attr_sets, attr_pairs, shapes, nodes, children):
+        r"""
+        :param strings --字符串池
+        :param attr_sets --每组属性两项：属性对起始编号、属性对数
+        :param attr_pairs --每对两项：键、值的字符串编号
+        :param shapes --每个形状四项：标签的字符串编号、属性组编号、层级、标记
+        :param nodes --每个节点三项：形状编号、孩子起始位置、孩子数；0号为根节点
+        :param children --孩子数组
+        """
+        self._strings = strings
+        self._attr_sets = attr_sets
+        self._attr_pairs = attr_pairs
+        self._shapes = shapes
+        self._nodes = nodes
+        self._children = children
+        # 载入时引用的缓冲区，数组依赖其存活
+        self._buffer = None
+
+    @classmethod
+    def from_text(cls, markdown_text: str) -> "CompiledTree":
+        r"""
+        解析一段markdown文本
+        """
+        root = create_root(_SYMBOLIC)
+        feeder = LineFeeder(root)
+        for text in markdown_text.split("\n"):
+            feeder.feed(text)
+        return cls.from_node(root)
+
+    @classmethod
+    def from_node(cls, root: MarkDownNode) -> "CompiledTree":
+        r"""
+        由`from_text`解析得到的节点树构建，节点按先序编号
+        """
+        string_ids = {}
+        strings = []
+        attr_set_ids = {}
+        attr_sets = array("I")
+        attr_pairs = array("I")
+        shape_ids = {}
+        shapes = array("I")
+        nodes = array("I")
+        children = array("I")
+
+        def intern(text: str) -> int:
+            sid = string_ids.get(text)
+            if sid is None:
+                sid = string_ids[text] = len(strings)
+                strings.append(text)
+            return sid
+
+        def shape_of(node: MarkDownNode) -> int:
+            attr = tuple((str(k), str(v)) for k, v in node._attr.items())
+            aid = attr_set_ids.get(attr)
+            if aid is None:
+                aid = attr_set_ids[attr] = len(attr_sets) // 2
+                attr_sets.extend((len(attr_pairs) // 2, len(attr)))
+                for k, v in attr:
+                    attr_pairs.extend((intern(k), intern(v)))
+            key = (node._tag, aid, node._level, SELF_CLOSE if node.self_close else 0)
+            sid = shape_ids.get(key)
+            if sid is None:
+                sid = shape_ids[key] = len(shapes) // 4
+                shapes.extend((intern(key[0]), aid, key[2], key[3]))
+            return sid
+
+        # 先序编号：节点出栈时分配编号，孩子区间在其孩子入栈前预留
+        nodes.extend((shape_of(root), 0, 0))
+        stack = [(root, 0)]
+        while stack:
+            node, index = stack.pop()
+            start = len(children)
+            nodes[3 * index + 1] = start
+            nodes[3 * index + 2] = len(node._children)
+            children.extend([0] * len(node._children))
+            pending = []
+            for i, child in enumerate(node._children):
+                if type(child) == str:
+                    children[start + i] = TEXT | intern(child)
+                else:
+                    child_index = len(nodes) // 3
+                    nodes.extend((shape_of(child), 0, 0))
+                    children[start + i] = child_index
+                    pending.append((child, child_index))
+            stack.extend(reversed(pending))
+
+        return cls(strings, attr_sets, attr_pairs, shapes, nodes, children)
+
+    def dumps(self) -> bytes:
+        r"""
+        序列化：魔数、头部、字符串池的字符偏移、各数组，最后是utf-8编码的字符串池
+        数组均为小端u32，起始位置按4字节对齐，可直接以memoryview载入
+        """
+        offsets = array("I", [0])
+        total = 0
+        for text in self._strings:
+            total += len(text)
+            offsets.append(total)
+        arrays = [
+            offsets,
+            array("I", self._attr_sets),
+            array("I", self._attr_pairs),
+            array("I", self._shapes),
+            array("I", self._nodes),
+            array("I", self._children),
+        ]
+        if sys.byteorder != "little":
+            for values in arrays:
+                values.byteswap()
+        header = HEADER.pack(
+            FORMAT_VERSION,
+            len(self._strings),
+            len(self._attr_sets) // 2,
+            len(self._attr_pairs) // 2,
+            len(self._shapes) // 4,
+            len(self._nodes) // 3,
+            len(self._children),
+            total,
+        )
+        pool = "".join(self._strings).encode("utf-8", "surrogatepass")
+        return b"".join([MAGIC, header] + [v.tobytes() for v in arrays] + [pool])
+
+    def dump(self, path):
+        with open(path, "wb") as f:
+            f.write(self.dumps())
+
+    @classmethod
+    def loads(cls, data) -> "CompiledTree":
+        r"""
+        由`dumps`的结果载入；数组直接引用`data`，调用方须保证其在使用期间有效
+        :param data --bytes、bytearray、memoryview或mmap
+        """
+        if bytes(data[:4]) != MAGIC:
+            raise ValueError("not a compiled markdown tree")
+        (
+            version,
+            n_strings,
+            n_attr_sets,
+            n_attr_pairs,
+            n_shapes,
+            n_nodes,
+            n_children,
+            n_chars,
+        ) = HEADER.unpack_from(data, len(MAGIC))
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                "unsupported compiled tree version %d (expected %d)"
+                % (version, FORMAT_VERSION)
+            )
+
+        offset = len(MAGIC) + HEADER.size
+        parts = []
+        for count in (
+            n_strings + 1,
+            2 * n_attr_sets,
+            2 * n_attr_pairs,
+            4 * n_shapes,
+            3 * n_nodes,
+            n_children,
+        ):
+            parts.append(_u32(data, offset, count))
+            offset += 4 * count
+        offsets = parts[0]
+
+        pool = str(memoryview(data)[offset:], "utf-8", "surrogatepass")
+        if len(pool) != n_chars:
+            raise ValueError("corrupted compiled tree")
+        strings = [pool[offsets[i] : offsets[i + 1]] for i in range(n_strings)]
+
+        tree = cls(strings, *parts[1:])
+        tree._buffer = data
+        return tree
+
+    @classmethod
+    def load(cls, path) -> "CompiledTree":
+        r"""
+        以内存映射载入文件
+        """
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.loads(data)
+
+    def _render_shapes(self, profile: RenderProfile) -> tuple:
+        r"""
+        按目标配置渲染各形状的开始/结束标签，并判断其文本孩子是否包一层code
+        """
+        strings = self._strings
+        attr_sets = self._attr_sets
+        attr_pairs = self._attr_pairs
+        shapes = self._shapes
+        roles = {
+            ROOT_ROLE: (profile.markdown_tag, profile.markdown_attr),
+            CODE_ROLE: (profile.code_tag, profile.code_attr),
+            FORMULA_ROLE: (profile.formula_tag, profile.formula_attr),
+            COMMENT_ROLE: (profile.comment_tag, {}),
+        }
+        ignore_set = MarkDownNode.IGNORE_SET
+
+        opens = []
+        closes = []
+        wraps = []
+        for i in range(0, len(shapes), 4):
+            tag = strings[shapes[i]]
+            start, count = attr_sets[2 * shapes[i + 1] : 2 * shapes[i + 1] + 2]
+            level = shapes[i + 2]
+            attr = {}
+            if tag in roles:
+                tag, base = roles[tag]
+                attr.update(base)
+            for j in range(2 * start, 2 * (start + count), 2):
+                attr[strings[attr_pairs[j]]] = strings[attr_pairs[j + 1]]
+
+            if shapes[i + 3] & SELF_CLOSE:
+                opens.append(render_tag(tag, attr, "/>"))
+                closes.append(None)
+            elif tag in ignore_set:
+                opens.append(None)
+                closes.append(None)
+            else:
+                opens.append(render_tag(tag, attr, ">") * level)
+                closes.append(("</" + tag + ">") * level)
+            wraps.append(attr.get("class", None) == profile.code_class)
+        return opens, closes, wraps
+
+    def render(self, config: Config = None) -> str:
+        r"""
+        在目标配置下渲染为html
+        编译时未做安全模式的转义，目标配置开启`safe_mode`时抛出ValueError
+        :param config --目标配置，默认`Config()`
+        """
+        profile = (config or Config()).profile
+        if profile.safe_mode:
+            raise ValueError("compiled trees cannot be rendered in safe mode")
+        opens, closes, wraps = self._render_shapes(profile)
+        strings = self._strings
+        nodes = self._nodes
+        children = self._children
+
+        parts = []
+        append = parts.append
+        stack = [0]
+        pop = stack.pop
+        push = stack.append
+        extend = stack.extend
+        while stack:
+            item = pop()
+            if type(item) == str:
+                append(item)
+                continue
+            if item & TEXT:
+                append(strings[item ^ TEXT])
+                continue
+
+            shape = nodes[3 * item]
+            open_tag = opens[shape]
+            if open_tag is not None:
+                append(open_tag)
+                close_tag = closes[shape]
+                if close_tag is None:
+                    # 自闭合
+                    continue
+                push(close_tag)
+            start = nodes[3 * item + 1]
+            kids = children[start : start + nodes[3 * item + 2]]
+            if wraps[shape]:
+                for child in reversed(kids):
+                    if child & TEXT:
+                        child = "<code>" + strings[child ^ TEXT] + "</code>"
+                    push(child)
+            else:
+                extend(reversed(kids))
+
+        html = "".join(parts)
+        if INLINE_CODE_OPEN in html:
+            html = html.replace(INLINE_CODE_OPEN, profile.inline_code_open)
+            html = html.replace(INLINE_CODE_CLOSE, profile.inline_code_close)
+        if FORMULA_OPEN in html:
+            html = html.replace(FORMULA_OPEN, profile.formula_open)
+            html = html.replace(FORMULA_CLOSE, profile.formula_close)
+        return html
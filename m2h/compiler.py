@@ -1,4 +1,7 @@
 import re
+from contextvars import ContextVar
+
+from m2h.template import escape_html, escape_raw, safe_url, unescape_html
 
 TITLE = re.compile(r"^(\#{1,6} )(.*)")
 UL = re.compile(r"^([+-]) (.*)")
@@ -6,8 +9,10 @@ OL = re.compile(r"^(\d+\.) (.*)")
 COMMENT = re.compile(r"^(\>+)(.*)")
 CODE = re.compile(r"^(\`\`\`)(.*)")
 FORMULAR = re.compile(r"^(\$\$)(.*)")
-LINE = re.compile(r"^[ -]*-{3,}[ -]*$")
-TABLE = re.compile(r"^ *\|?(?:[\-\: ]+\|)+[\-\: ]+\|? *$")
+# 横线与表格分隔行只做字符集的整行匹配，结构在`is_line`、`is_table_delimiter`中
+# 用线性的字符串操作判断；原先的`^[ -]*-{3,}[ -]*$`等写法在长行上会回溯
+LINE = re.compile(r"[ -]*")
+TABLE = re.compile(r"[\-\: |]*")
 # order
 IMG = re.compile(r"!\[([^\[]*)\]\(([^\(]*)\)")
 LINK = re.compile(r"\[([^\[]*)\]\(([^\(]*)\)")
@@ -15,6 +20,178 @@ BOLD = re.compile(r"(?:\*\*[^\*]*\*\*|\_\_[^\_]*\_\_)")
 ITALIC = re.compile(r"(?:\*[^\*]*\*|\_[^\_]*\_)")
 I_CODE = re.compile(r"\`([^\`]*)\`")
 I_FORMULAR = re.compile(r"\$([^\$]*)\$")
+# 内嵌标识可能的起始字符；不含这些字符的文本跳过内嵌解析
+INLINE_HEADS = re.compile(r"[!\[*_`$]")
+# 安全模式下另需处理含待转义字符的文本
+SAFE_HEADS = re.compile(r"[!\[*_`$&<>\"]")
+# 表格行中的反斜杠转义与单元格分隔符
+CELL_TOKEN = re.compile(r"\\.|\|")
+
+
+# 构建章节索引时的收集器（`m2h.sections.SectionIndex`），记录顶层标题、链接与图片
+SECTION_INDEX = ContextVar("m2h_section_index", default=None)
+
+# 可能开启表格的行首字符
+TABLE_HEADS = frozenset("|-:")
+
+# 表格最多的列数；分隔行的列数超过时不开启表格，按普通文本处理
+# 每行补齐到表头的列数，列数有上限后每行的代价不超过该上限，
+# 列数极多的表头加大量短行不会使输出随行数×列数增长
+TABLE_MAX_COLUMNS = 128
+
+
+def is_line(text: str) -> bool:
+    r"""
+    横线：只含空格与横线，且至少有三个连续的横线
+    """
+    return "---" in text and LINE.fullmatch(text) is not None
+
+
+def is_table_delimiter(text: str) -> bool:
+    r"""
+    表格分隔行：首尾可有空格与一个竖线，至少两个单元格，每格由`-: `组成且非空
+    与`^ *\|?(?:[\-\: ]+\|)+[\-\: ]+\|? *$`等价；首尾只含空格的片段既可视为
+    空白也可视为单元格，按单元格计数
+    """
+    if "|" not in text or "||" in text or TABLE.fullmatch(text) is None:
+        return False
+    cells = text.count("|") - 1
+    if text[0] != "|":
+        cells += 1
+    if text[-1] != "|":
+        cells += 1
+    return cells >= 2
+
+
+def split_cells(text: str) -> list:
+    r"""
+    切分表格行的单元格：单次扫描，`\|`是单元格内的竖线，其余反斜杠转义原样保留
+    首尾的空格以及首尾各一个作为分隔符的竖线不产生单元格
+    """
+    text = text.strip(" ")
+    if "\\" not in text:
+        cells = text.split("|")
+    else:
+        cells = []
+        parts = []
+        pos = 0
+        for m in CELL_TOKEN.finditer(text):
+            token = m.group()
+            if token == "|":
+                parts.append(text[pos : m.start()])
+                cells.append("".join(parts))
+                parts = []
+            elif token == "\\|":
+                parts.append(text[pos : m.start()])
+                parts.append("|")
+            else:
+                continue
+            pos = m.end()
+        parts.append(text[pos:])
+        cells.append("".join(parts))
+
+    # 空串只能来自行首/行尾的分隔符
+    if len(cells) > 1 and cells[-1] == "":
+        cells.pop()
+    if len(cells) > 1 and cells[0] == "":
+        del cells[0]
+    return cells
+
+
+# 分隔行单元格两端的冒号 -> 对齐属性，未标注时不加属性
+ALIGN_ATTRS = {
+    (True, False): {"align": "left"},
+    (False, True): {"align": "right"},
+    (True, True): {"align": "center"},
+    (False, False): None,
+}
+
+
+def parse_align(cells: list) -> list:
+    r"""
+    由分隔行的各单元格（如`:---`、`---:`、`:---:`）得到各列单元格的属性
+    """
+    aligns = []
+    for cell in cells:
+        cell = cell.strip(" ")
+        aligns.append(ALIGN_ATTRS[cell[:1] == ":", cell[-1:] == ":"])
+    return aligns
+
+
+# 安全模式下写入属性值的地址与alt中的内嵌标识字符转为实体，后续各步不会在属性值内匹配
+ATTR_MARKS = str.maketrans(
+    {"*": "&#42;", "_": "&#95;", "`": "&#96;", "$": "&#36;", "[": "&#91;", "]": "&#93;"}
+)
+
+
+def _image_tag(m):
+    return '<img src="%s" alt="%s"/>' % (m.group(2), m.group(1))
+
+
+def _link_tag(m):
+    return '<a href="%s">%s</a>' % (m.group(2), m.group(1))
+
+
+def _bold_tag(m):
+    return "<b>%s</b>" % m.group()[2:-2]
+
+
+def _italic_tag(m):
+    return "<i>%s</i>" % m.group()[1:-1]
+
+
+def _safe_image_tag(m):
+    alt, src = m.group(1), m.group(2)
+    if safe_url(src) is None:
+        return alt
+    return '<img src="%s" alt="%s"/>' % (
+        src.translate(ATTR_MARKS),
+        alt.translate(ATTR_MARKS),
+    )
+
+
+def _safe_link_tag(m):
+    label, href = m.group(1), m.group(2)
+    # 已转义的地址不含引号与尖括号，含有时来自前一步生成的图片标签
+    if '"' in href or "<" in href or safe_url(href) is None:
+        return label
+    return '<a href="%s">%s</a>' % (href.translate(ATTR_MARKS), label)
+
+
+def _indexed(add, repl, escaped: bool):
+    r"""
+    替换的同时把(文字, 地址)记入章节索引，`escaped`时先还原转义
+    """
+
+    def record(m):
+        if escaped:
+            add(unescape_html(m.group(1)), unescape_html(m.group(2)))
+        else:
+            add(m.group(1), m.group(2))
+        return repl(m)
+
+    return record
+
+
+def _substitute(pattern, repl, text: str, kinds, name):
+    r"""
+    一种内嵌标识的正则替换；给出`kinds`时累计匹配次数，
+    `name`为(星号形式, 下划线形式)时按匹配的首字符区分
+    """
+    if kinds is None:
+        return pattern.sub(repl, text)
+    if type(name) == str:
+        text, n = pattern.subn(repl, text)
+        if n:
+            kinds[name] += n
+        return text
+    star, under = name
+
+    def count(m):
+        kinds[star if m.group()[0] == "*" else under] += 1
+        return repl(m)
+
+    return pattern.sub(count, text)
 
 
 class Compiler:
@@ -27,7 +204,10 @@ class Compiler:
 
             # 得到node
             level = m_title.count("#")
-            t_node = parent.create_node(tag="h" + str(level))
+            index = SECTION_INDEX.get()
+            if index is not None and parent is index.root:
+                index.add_heading(level, new_text)
+            t_node = parent.create_node(tag="h" + str(level), config=parent._config)
             parent._append_child(t_node)
 
             # 提取剩余部分
@@ -41,11 +221,11 @@ class Compiler:
         if m_ul is not None:
             _, new_text = m_ul.groups()
             if parent._last_child._tag == "ul":
-                li = parent.create_node(tag="li")
+                li = parent.create_node(tag="li", config=parent._config)
                 parent._last_child._append_child(li)
             else:
-                ul = parent.create_node(tag="ul")
-                li = parent.create_node(tag="li")
+                ul = parent.create_node(tag="ul", config=parent._config)
+                li = parent.create_node(tag="li", config=parent._config)
                 ul._append_child(li)
                 parent._append_child(ul)
             # 提取剩余部分
@@ -56,11 +236,11 @@ class Compiler:
         if m_ol is not None:
             _, new_text = m_ol.groups()
             if parent._last_child._tag == "ol":
-                li = parent.create_node(tag="li")
+                li = parent.create_node(tag="li", config=parent._config)
                 parent._last_child._append_child(li)
             else:
-                ol = parent.create_node(tag="ol")
-                li = parent.create_node(tag="li")
+                ol = parent.create_node(tag="ol", config=parent._config)
+                li = parent.create_node(tag="li", config=parent._config)
                 ol._append_child(li)
                 parent._append_child(ol)
             # 提取剩余部分
@@ -75,12 +255,14 @@ class Compiler:
             m_comment, content = m_comment.groups()
             level = m_comment.count(">")
             if (
-                parent._last_child._tag == parent._config.get("comment_tag")
+                parent._last_child._tag == parent._config.profile.comment_tag
                 and parent._last_child._level >= level
             ):
                 node = parent._last_child
             else:
-                node = parent.create_node(tag=parent._config.get("comment_tag"))
+                node = parent.create_node(
+                    tag=parent._config.profile.comment_tag, config=parent._config
+                )
                 node._level = level
                 parent._append_child(node)
             parent._append_line(text=content.lstrip(" "), parent=node)
@@ -96,11 +278,14 @@ class Compiler:
                 return True
             parent.block_open = True
             m_code, language = m_code.groups()
+            profile = parent._config.profile
             node = parent.create_node(
-                tag=parent._config.get("code_tag"), attr=parent._config.get("code_attr")
+                tag=profile.code_tag, attr=profile.code_attr, config=parent._config
             )
 
             if language != "":
+                if profile.safe_mode:
+                    language = escape_html(language)
                 node._set_attribute("language", language)
             parent._append_child(node)
             return True
@@ -118,9 +303,11 @@ class Compiler:
                 return True
             parent.block_open = True
             m_formula, _ = m_formula.groups()
+            profile = parent._config.profile
             node = parent.create_node(
-                tag=parent._config.get("formula_tag"),
-                attr=parent._config.get("formula_attr"),
+                tag=profile.formula_tag,
+                attr=profile.formula_attr,
+                config=parent._config,
             )
             parent._append_child(node)
             return True
@@ -130,6 +317,12 @@ class Compiler:
     def extract_block(parent, text):
         if parent.block_open:
             node = parent._last_child
+            profile = parent._config.profile
+            if profile.safe_mode:
+                if profile.formula_raw and node._tag == profile.formula_tag:
+                    text = escape_raw(text)
+                else:
+                    text = escape_html(text)
             # 代码块
             # 数学公式
             node._append_child(text)
@@ -138,9 +331,8 @@ class Compiler:
 
     @staticmethod
     def extract_line(parent, text):
-        m_line = LINE.search(text)
-        if m_line is not None:
-            line = parent.create_node(tag="hr")
+        if is_line(text):
+            line = parent.create_node(tag="hr", config=parent._config)
             parent._append_child(line)
             return True
         return False
@@ -149,135 +341,244 @@ class Compiler:
     def extract_table(parent, text: str, pre_text: str):
         # extract table-data
         if parent.table_open:
-            tbody = text.strip(" ").strip("|").split("|")
-            for idx, item in enumerate(tbody):
-                if item.find("\\") != -1:
-                    tbody[idx] = item + "|"
-                    tbody.pop(idx + 1)
-
-            tr = parent.create_node(tag="tr")
-            # 转为th
-            for i in range(parent.col_num):
-                if i < len(tbody):
-                    th = parent.create_node(tag="td")
-                    parent._append_line(text=tbody[i], parent=th, line_start=False)
-                    tr._append_child(th)
-                else:
-                    tr._append_child(parent.create_node(tag="td"))
+            tr = parent.create_node(tag="tr", config=parent._config)
+            Compiler.append_cells(parent, tr, "td", split_cells(text))
             parent._last_child._append_child(tr)
             return True
 
-        m_table = TABLE.search(text)
         # extract table
-        if m_table is not None and not parent.table_open:
-            table_form = m_table.group().strip(" ").strip("|")
-            parent.col_num = len(table_form.split("|"))
-
-            table = parent.create_node(tag="table")
+        if not parent.table_open and is_table_delimiter(text):
+            table_form = text.strip(" ").strip("|").split("|")
+            parent.col_num = len(table_form)
+            if parent.col_num > TABLE_MAX_COLUMNS:
+                return False
 
             # 获取headers
-            headers = pre_text.strip(" ").strip("|").split("|")
-            for idx, item in enumerate(headers):
-                if item.find("\\") != -1:
-                    headers[idx] = item + "|"
-                    headers.pop(idx + 1)
+            headers = split_cells(pre_text)
             if len(headers) == parent.col_num:
                 # 满足条件则提取table
                 parent.table_open = True
+                parent.col_align = parse_align(table_form)
                 parent._remove_last()
 
-                tr = parent.create_node(tag="tr")
-                # 转为th
-                for i in range(parent.col_num):
-                    if i < len(headers):
-                        th = parent.create_node(tag="th")
-                        parent._append_line(
-                            text=headers[i], parent=th, line_start=False
-                        )
-                        tr._append_child(th)
-                    else:
-                        tr._append_child(parent.create_node(tag="th"))
+                table = parent.create_node(tag="table", config=parent._config)
+                tr = parent.create_node(tag="tr", config=parent._config)
+                Compiler.append_cells(parent, tr, "th", headers)
                 table._append_child(tr)
                 parent._append_child(table)
                 return True
         return False
 
+    @staticmethod
+    def append_cells(parent, tr, tag: str, cells: list):
+        r"""
+        一次生成一行的全部单元格，直接写入`tr`的孩子列表；单元格文本只做内嵌解析，
+        不含内嵌标识起始字符的单元格原样使用；多出的单元格丢弃，缺少的补空单元格
+        :param parent --表格所属父节点，记录列数与各列对齐
+        :param tr --当前行节点
+        :param tag --"th"或"td"
+        :param cells --`split_cells`切分得到的单元格文本
+        """
+        config = parent._config
+        aligns = parent.col_align
+        node = type(tr)
+        render = parent._inline_renderer()
+        # 安全模式下含待转义字符的单元格同样须经过解析
+        marked = SAFE_HEADS.search if config.profile.safe_mode else INLINE_HEADS.search
+        row = tr._children
+
+        count = min(len(cells), parent.col_num)
+        for i in range(count):
+            text = cells[i]
+            if marked(text) is not None:
+                text = render(text)
+            row.append(
+                node(tag=tag, attr=aligns[i], children=[text], parent=tr, config=config)
+            )
+
+        for i in range(count, parent.col_num):
+            row.append(node(tag=tag, attr=aligns[i], parent=tr, config=config))
+
     @staticmethod
     def extract_enter(parent, text):
         if text == "":
             parent.table_open = False
-            parent._append_child(parent.create_node(tag="br", self_close=True))
+            parent._append_child(
+                parent.create_node(tag="br", self_close=True, config=parent._config)
+            )
+            return True
+        return False
+
+    @staticmethod
+    def extract_block_line(parent, text, pre_text, handlers=None):
+        r"""
+        块级分派：根据首个非空字符直接选择候选解析函数，顺序与原先的逐一尝试一致
+        :param parent --当前文本所属父节点
+        :param text --当前行的文本
+        :param pre_text --上一行文本
+        :param handlers --块级解析函数表，默认为`BLOCK_HANDLERS`
+        :return bool --是否已作为块级文本处理
+        """
+        if handlers is None:
+            handlers = BLOCK_HANDLERS
+
+        # 预处理块级
+        if handlers["extract_enter"](parent, text):
+            return True
+
+        head = text.lstrip(" ")[:1]
+
+        # 代码块、数学公式的开合
+        if head == "`" and handlers["extract_code"](parent, text):
+            return True
+        if head == "$" and handlers["extract_formula"](parent, text):
             return True
+
+        # 表格数据行，或可能的表格分隔行
+        if (parent.table_open or head in TABLE_HEADS) and handlers["extract_table"](
+            parent, text, pre_text
+        ):
+            return True
+
+        # 代码区、公式区内部
+        if handlers["extract_block"](parent, text):
+            return True
+
+        # 标题、列表、注释、横线
+        for extract in handlers["dispatch"].get(head, ()):
+            if extract(parent, text):
+                return True
         return False
 
     @staticmethod
     def extract_image(text):
-        m_img_list = IMG.findall(text)
-        for m_img in m_img_list:
-            content, src = m_img
-            text = text.replace(
-                "![%s](%s)" % m_img, '<img src="%s" alt="%s"/>' % (src, content)
-            )
-        return text
+        return IMG.sub(_image_tag, text)
 
     @staticmethod
     def extract_link(text):
-        m_link_list = LINK.findall(text)
-        for m_link in m_link_list:
-            content, href = m_link
-            text = text.replace(
-                "[%s](%s)" % m_link, '<a href="%s">%s</a>' % (href, content)
-            )
-        return text
+        return LINK.sub(_link_tag, text)
 
     @staticmethod
     def extract_bold(text):
-        m_bold_list = BOLD.findall(text)
-        for m_bold in m_bold_list:
-            symbol = m_bold[0]
-            if symbol == "*":
-                content = m_bold.strip("*")
-                text = text.replace(m_bold, "<b>%s</b>" % content)
-            else:
-                content = m_bold.strip("_")
-                text = text.replace(m_bold, "<b>%s</b>" % content)
-        return text
+        return BOLD.sub(_bold_tag, text)
 
     @staticmethod
     def extract_italic(text):
-        m_italic_list = ITALIC.findall(text)
-        for m_italic in m_italic_list:
-            symbol = m_italic[0]
-            if symbol == "*":
-                content = m_italic.strip("*")
-                text = text.replace(m_italic, "<i>%s</i>" % content)
-            else:
-                content = m_italic.strip("_")
-                text = text.replace(m_italic, "<i>%s</i>" % content)
-        return text
+        return ITALIC.sub(_italic_tag, text)
 
     @staticmethod
     def extract_inner_code(parent, text):
-        m_code_list = I_CODE.findall(text)
-        for m_code in m_code_list:
-            code = parent.create_node(
-                # tag=parent._config.get("code_tag"),
-                tag="code",
-                attr=parent._config.get("code_attr"),
-                children=[m_code],
-            )
-            text = text.replace("`%s`" % m_code, "%s" % code.to_html())
-
-        return text
+        profile = parent._config.profile
+        return I_CODE.sub(
+            lambda m: profile.inline_code_open + m.group(1) + profile.inline_code_close,
+            text,
+        )
 
     @staticmethod
     def extract_inner_formula(parent, text):
-        m_math_list = I_FORMULAR.findall(text)
-        for m_math in m_math_list:
-            formula = parent.create_node(
-                tag=parent._config.get("formula_tag"),
-                attr=parent._config.get("formula_attr"),
-                children=[m_math],
+        profile = parent._config.profile
+        return I_FORMULAR.sub(
+            lambda m: profile.formula_open + m.group(1) + profile.formula_close, text
+        )
+
+    @staticmethod
+    def extract_inline(parent, text, kinds=None):
+        r"""
+        解析全部内嵌标识：依次替换图片、链接、粗体、斜体、内嵌代码、内嵌公式，
+        后一种在前一种的结果上进行，与逐个调用上面的`extract_*`一致；
+        粗体先于斜体，`*a **b** c*`为斜体内含粗体。文本中没有某种标识的字符时跳过该种
+        :param parent --当前文本所属父节点
+        :param text --当前行的文本
+        :param kinds --可选的计数器，按种类累计匹配次数
+        """
+        if INLINE_HEADS.search(text) is None:
+            return text
+        return Compiler._substitute_all(parent, text, kinds, False)
+
+    @staticmethod
+    def extract_inline_safe(parent, text, kinds=None):
+        r"""
+        安全模式下的`extract_inline`：整行先转义一次，再依次替换内嵌标识；
+        转义不改动任何标识字符，匹配结果与未转义时一一对应，内容均已转义
+        链接与图片地址的协议不在`SAFE_SCHEMES`中时只输出其文字；
+        写入属性值的地址与alt中的标识字符转为实体，不再被后续各步替换
+        参数同`extract_inline`
+        """
+        if SAFE_HEADS.search(text) is None:
+            return text
+        text = escape_html(text)
+        if INLINE_HEADS.search(text) is None:
+            return text
+        return Compiler._substitute_all(parent, text, kinds, True)
+
+    @staticmethod
+    def _substitute_all(parent, text, kinds, safe: bool):
+        r"""
+        `extract_inline`与`extract_inline_safe`共用的逐种替换，`safe`时`text`已转义
+        """
+        if "](" in text:
+            if safe:
+                image, link = _safe_image_tag, _safe_link_tag
+            else:
+                image, link = _image_tag, _link_tag
+            index = SECTION_INDEX.get()
+            if index is not None:
+                image = _indexed(index.add_image, image, safe)
+                link = _indexed(index.add_link, link, safe)
+            if "![" in text:
+                text = _substitute(IMG, image, text, kinds, "img_src")
+            text = _substitute(LINK, link, text, kinds, "link_href")
+        if "**" in text or "__" in text:
+            text = _substitute(
+                BOLD, _bold_tag, text, kinds, ("bold_star", "bold_under")
             )
-            text = text.replace("$%s$" % m_math, "%s" % formula.to_html())
+        if "*" in text or "_" in text:
+            text = _substitute(
+                ITALIC, _italic_tag, text, kinds, ("italic_star", "italic_under")
+            )
+        if "`" in text:
+            profile = parent._config.profile
+            code_open = profile.inline_code_open
+            code_close = profile.inline_code_close
+
+            def code(m):
+                return code_open + m.group(1) + code_close
+
+            text = _substitute(I_CODE, code, text, kinds, "code")
+        if "$" in text:
+            profile = parent._config.profile
+            formula_open = profile.formula_open
+            formula_close = profile.formula_close
+            if safe and profile.formula_raw:
+
+                def formula(m):
+                    raw = escape_raw(unescape_html(m.group(1)))
+                    return formula_open + raw + formula_close
+
+            else:
+
+                def formula(m):
+                    return formula_open + m.group(1) + formula_close
+
+            text = _substitute(I_FORMULAR, formula, text, kinds, "formula")
         return text
+
+
+# 行首字符 -> 候选块级解析函数
+BLOCK_DISPATCH = {
+    "#": (Compiler.extract_title,),
+    ">": (Compiler.extract_comment,),
+    "-": (Compiler.extract_ul_ol, Compiler.extract_line),
+    "+": (Compiler.extract_ul_ol,),
+}
+BLOCK_DISPATCH.update({str(d): (Compiler.extract_ul_ol,) for d in range(10)})
+
+# 块级解析函数表，开启性能统计时替换为计时版本
+BLOCK_HANDLERS = {
+    "extract_enter": Compiler.extract_enter,
+    "extract_code": Compiler.extract_code,
+    "extract_formula": Compiler.extract_formula,
+    "extract_table": Compiler.extract_table,
+    "extract_block": Compiler.extract_block,
+    "dispatch": BLOCK_DISPATCH,
+}
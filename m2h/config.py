@@ -1,11 +1,47 @@
+import json
 from typing import TypeAlias
 
+from m2h.template import RenderProfile
+
 # define type
 ReturnValue: TypeAlias = str | dict | None
 
+# 各配置项的默认值
+DEFAULTS = {
+    "markdown_tag": "div",
+    "markdown_attr": {"class": "markdown-body"},
+    "code_tag": "pre",
+    "code_attr": {"class": "codehilite"},
+    "formula_tag": "script",
+    "formula_attr": {"type": "math/tex"},
+    "comment_tag": "blockquote",
+    # 内嵌解析结果缓存：True始终使用，False不使用，"auto"按实测命中率自动启停；
+    # 只在单元格、列表项大量重复的文档上有收益，默认不使用
+    "inline_memo": False,
+    # 安全模式：转义文本与属性值，拒绝不安全协议的链接与图片地址
+    "safe_mode": False,
+}
+
+# 配置指纹 -> 编译后的渲染模板，同一进程内取值相同的配置只编译一次
+_PROFILES = {}
+PROFILE_CACHE_SIZE = 256
+
+
+def _restore(values: dict, profile: RenderProfile):
+    r"""
+    反序列化配置，并沿用随之传来的渲染模板
+    """
+    return Config(_profile=profile, **values)
+
 
 class Config:
-    def __init__(self, **config):
+    r"""
+    转换配置，创建后不可修改；创建时编译为渲染模板`profile`
+    """
+
+    __slots__ = ("_config", "_fingerprint", "profile")
+
+    def __init__(self, _profile: RenderProfile = None, **config):
         r"""
         `[OPTIONAL]`
         ```
@@ -22,31 +58,62 @@ class Config:
         formula_attr   : dict = ?,
 
         comment_tag    : str  = ?,
+
+        inline_memo    : bool | str = ?,
+
+        safe_mode      : bool = ?,
         ```
         """
-        self._config = {
-            "markdown_tag": "div"
-            if config.get("markdown_tag", None) is None
-            else config.get("markdown_tag", None),
-            "markdown_attr": {"class": "markdown-body"}
-            if config.get("markdown_attr", None) is None
-            else config.get("markdown_attr", None),
-            "code_tag": "pre"
-            if config.get("code_tag", None) is None
-            else config.get("code_tag", None),
-            "code_attr": {"class": "codehilite"}
-            if config.get("code_attr", None) is None
-            else config.get("code_attr", None),
-            "formula_tag": "script"
-            if config.get("formula_tag", None) is None
-            else config.get("formula_tag", None),
-            "formula_attr": {"type": "math/tex"}
-            if config.get("formula_attr", None) is None
-            else config.get("formula_attr", None),
-            "comment_tag": "blockquote"
-            if config.get("comment_tag", None) is None
-            else config.get("comment_tag", None),
-        }
+        values = {}
+        for key, default in DEFAULTS.items():
+            value = config.get(key, None)
+            if value is None:
+                value = default
+            # 复制传入的属性字典，调用方之后的修改不影响配置
+            values[key] = dict(value) if type(value) == dict else value
+        fingerprint = json.dumps(values, sort_keys=True, ensure_ascii=False)
+
+        profile = _PROFILES.get(fingerprint)
+        if profile is None:
+            profile = RenderProfile(values) if _profile is None else _profile
+            if len(_PROFILES) >= PROFILE_CACHE_SIZE:
+                _PROFILES.clear()
+            _PROFILES[fingerprint] = profile
+        # 取值相同的配置与其模板共享同一份属性字典
+        values["markdown_attr"] = profile.markdown_attr
+        values["code_attr"] = profile.code_attr
+        values["formula_attr"] = profile.formula_attr
+
+        object.__setattr__(self, "_config", values)
+        object.__setattr__(self, "_fingerprint", fingerprint)
+        object.__setattr__(self, "profile", profile)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Config is frozen")
+
+    def __delattr__(self, name):
+        raise AttributeError("Config is frozen")
+
+    def __reduce__(self):
+        return _restore, (self._config, self.profile)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Config):
+            return NotImplemented
+        return self._fingerprint == other._fingerprint
+
+    def __hash__(self) -> int:
+        return hash(self._fingerprint)
 
     def get(self, _key, _default=None) -> ReturnValue:
-        return self._config.get(_key, _default)
+        r"""
+        获取配置项；属性字典返回副本，修改它不影响配置与共享同一模板的其他配置
+        """
+        value = self._config.get(_key, _default)
+        return dict(value) if type(value) == dict else value
+
+    def fingerprint(self) -> str:
+        r"""
+        配置指纹：取值相同的配置得到相同的字符串，可用作缓存键
+        """
+        return self._fingerprint
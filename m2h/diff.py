@@ -0,0 +1,164 @@
+from m2h.mdNode import MarkDownNode, NodeView
+
+
+def tree_hash(node) -> int:
+    r"""
+    结构哈希：标签、属性、层级、自闭合与各孩子的哈希；文本孩子即字符串的哈希
+    以显式栈后序计算，结果缓存在节点上，同一棵已完成的树只计算一次；
+    增量更新沿用的子树是同一批节点，哈希随之沿用
+    """
+    if type(node) == str:
+        return hash(node)
+    if node._hash is not None:
+        return node._hash
+
+    stack = [(node, False)]
+    while stack:
+        current, ready = stack.pop()
+        if ready:
+            hashes = tuple(
+                [hash(_c) if type(_c) == str else _c._hash for _c in current._children]
+            )
+            attr = tuple([(k, str(v)) for k, v in current._attr.items()])
+            current._hash = hash(
+                (current._tag, attr, current._level, current.self_close, hashes)
+            )
+            continue
+        stack.append((current, True))
+        for _c in current._children:
+            if type(_c) != str and _c._hash is None:
+                stack.append((_c, False))
+    return node._hash
+
+
+def _same_shape(a: MarkDownNode, b: MarkDownNode) -> bool:
+    r"""
+    两个节点自身（不含孩子）是否相同，相同时只需比较孩子
+    """
+    return (
+        a._tag == b._tag
+        and a._level == b._level
+        and a.self_close == b.self_close
+        and a._attr == b._attr
+    )
+
+
+def _payload(child, raw: bool):
+    r"""
+    插入或替换的内容，格式与`to_dict`一致：code节点内的文本为str，其余文本为字符串节点
+    """
+    if type(child) == str:
+        if raw:
+            return child
+        return {"tag": MarkDownNode.STRING, "attr": {}, "children": [child]}
+    return child.to_dict()
+
+
+def diff_tree(old, new) -> list:
+    r"""
+    比较两棵节点树，得到把旧树的`to_dict`变为新树的补丁操作，按顺序应用
+    结构哈希相同的子树视为未变化，直接跳过；孩子列表先去掉哈希相同的公共前缀与后缀，
+    余下部分逐一配对：自身相同的节点递归比较，两段文本给出`text`，其余整体替换，
+    多出的删除、缺少的插入
+    :param old --上一次的根节点（MarkDownNode或NodeView），为None时整体替换
+    :param new --这一次的根节点
+    :return list --补丁操作，`path`为从根起的孩子下标：
+        `{"op": "replace", "path": [...], "node": ...}`
+        `{"op": "insert", "path": [...], "node": ...}`
+        `{"op": "remove", "path": [...]}`
+        `{"op": "text", "path": [...], "text": "..."}`
+
+    :example
+    >>> previous = md.get_dom_view()
+    >>> md.update((10, 11), "changed line")
+    >>> ops = diff_tree(previous, md.get_dom_view())
+    """
+    if isinstance(old, NodeView):
+        old = old._node
+    if isinstance(new, NodeView):
+        new = new._node
+    if old is None or not _same_shape(old, new):
+        return [{"op": "replace", "path": [], "node": new.to_dict()}]
+
+    ops = []
+    raw_set = MarkDownNode.RAW_TEXT_SET
+    stack = [(old, new, [])]
+    while stack:
+        a, b, path = stack.pop()
+        if a is b or tree_hash(a) == tree_hash(b):
+            continue
+        raw = b._tag in raw_set
+        xs = a._children
+        ys = b._children
+
+        # 去掉公共前缀与后缀
+        begin = 0
+        limit = min(len(xs), len(ys))
+        while begin < limit and (
+            xs[begin] is ys[begin] or tree_hash(xs[begin]) == tree_hash(ys[begin])
+        ):
+            begin += 1
+        x_end = len(xs)
+        y_end = len(ys)
+        while (
+            x_end > begin
+            and y_end > begin
+            and (
+                xs[x_end - 1] is ys[y_end - 1]
+                or tree_hash(xs[x_end - 1]) == tree_hash(ys[y_end - 1])
+            )
+        ):
+            x_end -= 1
+            y_end -= 1
+
+        # 中间部分逐一配对
+        paired = min(x_end, y_end) - begin
+        for i in range(begin, begin + paired):
+            x = xs[i]
+            y = ys[i]
+            if type(x) == str and type(y) == str:
+                ops.append({"op": "text", "path": path + [i], "text": y})
+            elif type(x) != str and type(y) != str and _same_shape(x, y):
+                stack.append((x, y, path + [i]))
+            else:
+                ops.append(
+                    {"op": "replace", "path": path + [i], "node": _payload(y, raw)}
+                )
+
+        # 删除从后往前，插入从前往后，前面已配对的下标不受影响
+        for i in range(x_end - 1, begin + paired - 1, -1):
+            ops.append({"op": "remove", "path": path + [i]})
+        for i in range(begin + paired, y_end):
+            ops.append(
+                {"op": "insert", "path": path + [i], "node": _payload(ys[i], raw)}
+            )
+    return ops
+
+
+def apply_patch(tree: dict, ops: list) -> dict:
+    r"""
+    把`diff_tree`的补丁应用到`to_dict`格式的树上，返回新树（原地修改）
+    浏览器端的应用逻辑与此相同
+    """
+    for op in ops:
+        path = op["path"]
+        if not path:
+            tree = op["node"]
+            continue
+        parent = tree
+        for i in path[:-1]:
+            parent = parent["children"][i]
+        siblings = parent["children"]
+        i = path[-1]
+        kind = op["op"]
+        if kind == "replace":
+            siblings[i] = op["node"]
+        elif kind == "insert":
+            siblings.insert(i, op["node"])
+        elif kind == "remove":
+            del siblings[i]
+        elif type(siblings[i]) == str:
+            siblings[i] = op["text"]
+        else:
+            siblings[i]["children"] = [op["text"]]
+    return tree
@@ -0,0 +1,131 @@
+from bisect import bisect_left, bisect_right
+
+from m2h.mdNode import LineFeeder, MarkDownNode
+
+
+class IncrementalDocument:
+    r"""
+    增量解析的文档：按顶层块切分为若干段，编辑时只重新解析受影响的段
+
+    段以「不在代码区/公式区内的空行」开头（首段从第0行开始）。
+    该空行会把缩进层级归零、关闭表格并追加一个br，此后的解析不再依赖之前的任何状态，
+    因此每段都可以从一个新的根节点独立解析，与整篇解析的结果完全一致。
+
+    >>> doc = IncrementalDocument(lambda: MarkDownNode(tag="div", config=Config()), text)
+    >>> doc.update((3, 4), "# new title")
+    """
+
+    def __init__(self, create_root, md_text: str = ""):
+        r"""
+        :param create_root --创建根节点的函数，每次解析使用一个新的根节点
+        :param md_text --初始文本
+        """
+        self._create_root = create_root
+        self._root = create_root()
+        self.lines = md_text.split("\n")
+        self._html = None
+
+        # 每段的起始行、孩子节点与html
+        self._starts = []
+        starts, children, htmls, _ = self._parse(0, 0)
+        self._starts = starts
+        self._children = children
+        self._htmls = htmls
+
+    def _parse(self, begin: int, edit_end: int, after: int = 0, delta: int = 0):
+        r"""
+        从第`begin`行开始解析，越过`edit_end`后一旦遇到与旧分段对齐的段首即停止
+        :param begin --起始行，必须是段首
+        :param edit_end --编辑区域在新文本中的结束行
+        :param after --编辑区域之后第一个旧段的序号
+        :param delta --编辑导致的行数变化，旧段首加上delta即为新行号
+        :return (starts, children, htmls, k) --新解析出的各段，以及对齐的旧段序号，
+                                               解析到文末时k为None
+        """
+        root = self._create_root()
+        feeder = LineFeeder(root)
+        lines = self.lines
+        old_starts = self._starts
+        bounds = []
+        k = after
+        aligned = None
+        for i in range(begin, len(lines)):
+            text = lines[i]
+            if i == begin or (text == "" and not root.block_open):
+                if i > begin and i >= edit_end:
+                    while k < len(old_starts) and old_starts[k] + delta < i:
+                        k += 1
+                    if k < len(old_starts) and old_starts[k] + delta == i:
+                        aligned = k
+                        break
+                bounds.append((i, len(root._children)))
+            feeder.feed(text)
+
+        starts, children, htmls = [], [], []
+        nodes = root._children
+        for idx, (line, first) in enumerate(bounds):
+            last = bounds[idx + 1][1] if idx + 1 < len(bounds) else len(nodes)
+            seg = nodes[first:last]
+            starts.append(line)
+            children.append(seg)
+            htmls.append(
+                "".join([_c if type(_c) == str else _c.to_html() for _c in seg])
+            )
+        return starts, children, htmls, aligned
+
+    def update(self, edit_range: tuple, new_text: str) -> str:
+        r"""
+        用`new_text`替换`edit_range`范围内的行，并返回新的html
+        :param edit_range --(起始行, 结束行)，左闭右开；起始行等于结束行时为插入
+        :param new_text --新的文本，按`\n`切分为若干行；为None时仅删除
+        """
+        start, end = edit_range
+        if not 0 <= start <= end <= len(self.lines):
+            raise IndexError(
+                "edit range %r out of %d lines" % (edit_range, len(self.lines))
+            )
+        new_lines = [] if new_text is None else new_text.split("\n")
+        delta = len(new_lines) - (end - start)
+        self.lines[start:end] = new_lines
+        if not self.lines:
+            # 空文本等价于一个空行
+            self.lines.append("")
+            delta += 1
+
+        # 编辑首行恰为段首时，前一段的结尾也可能改变，需从前一段开始
+        first = max(bisect_right(self._starts, start - 1) - 1, 0)
+        # 编辑区域之后的旧段
+        after = bisect_left(self._starts, end)
+
+        starts, children, htmls, aligned = self._parse(
+            self._starts[first], start + len(new_lines), after, delta
+        )
+        resume = len(self._starts) if aligned is None else aligned
+
+        self._starts[first:resume] = starts
+        self._children[first:resume] = children
+        self._htmls[first:resume] = htmls
+        if delta:
+            for idx in range(first + len(starts), len(self._starts)):
+                self._starts[idx] += delta
+        self._html = None
+        return self.to_html()
+
+    def to_html(self) -> str:
+        if self._html is None:
+            root = self._root
+            self._html = root._open_tag + "".join(self._htmls) + root._close_tag
+        return self._html
+
+    def root(self) -> MarkDownNode:
+        r"""
+        拼合各段孩子得到完整的节点树
+        """
+        root = self._create_root()
+        for seg in self._children:
+            root._children.extend(seg)
+        return root
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
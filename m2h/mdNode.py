@@ -1,13 +1,27 @@
 import re
+from functools import partial
+from types import MappingProxyType
 from m2h.config import Config
 from typing import TypeAlias
-from m2h.compiler import Compiler
+from m2h.compiler import SECTION_INDEX, Compiler
+from m2h.memo import INLINE_MEMO
+from m2h.profile import PROFILE
+from m2h.template import render_tag
 
 # define type
 Node: TypeAlias = "MarkDownNode"
 
 INDENT = re.compile(r"^ +")
 
+# 流式转换时，未闭合的顶层孩子超过该数量也会提前输出
+FLUSH_SIZE = 64
+
+# 无属性节点共享的空属性字典，写入时由`_set_attribute`复制
+EMPTY_ATTR = {}
+
+# to_html写入文件时，每累积该数量的片段写入一次
+WRITE_BATCH = 1024
+
 
 class MarkDownNode:
     r"""
@@ -19,7 +33,23 @@ class MarkDownNode:
     STRING = "__string__"
     IGNORE_SET = set([UNKNOWN, STRING])
 
-    _config = None
+    # 文本孩子直接以str保存；to_dict时仍按STRING节点输出，code节点内的文本除外
+    RAW_TEXT_SET = set(["code"])
+
+    __slots__ = (
+        "_tag",
+        "_attr",
+        "_parent",
+        "_children",
+        "_config",
+        "block_open",
+        "table_open",
+        "col_num",
+        "col_align",
+        "_level",
+        "self_close",
+        "_hash",
+    )
 
     @classmethod
     def create_node(cls, **kwargs):
@@ -41,6 +71,7 @@ class MarkDownNode:
         children: list = None,
         parent=None,
         self_close=False,
+        config: Config = None,
     ):
         r"""
         > 初始化html的dom节点
@@ -48,14 +79,18 @@ class MarkDownNode:
         :param attr --属性
         :param children --子节点, 默认为list()
         :param parent --父节点默认为None
+        :param config --配置选项，同一棵树上的节点共享同一份配置
         >>> node = MarkDownNode(tag='div', children=['hello world'], parent=None)
         >>> print(node)
         """
         # 节点基本属性，标签、属性、父级、孩子
         self._tag = self.STRING if tag is None else tag
-        self._attr = {} if attr is None else attr
+        self._attr = EMPTY_ATTR if attr is None else attr
         self._parent = parent
-        self._children: list[MarkDownNode] = [] if children is None else children
+        # 自闭合节点没有孩子，共享空元组
+        self._children: list[MarkDownNode | str] = (
+            (() if self_close else []) if children is None else children
+        )
 
         # 代码区或公式区的标识符
         self.block_open = False
@@ -63,6 +98,8 @@ class MarkDownNode:
         # 表格标识符
         self.table_open = False
         self.col_num = 0
+        # 各列单元格的对齐属性，由分隔行解析
+        self.col_align = ()
 
         # 嵌套层级
         self._level = 1
@@ -70,41 +107,31 @@ class MarkDownNode:
         # 自闭合
         self.self_close = self_close
 
-    @staticmethod
-    def set_config(config: Config):
+        # 配置
+        self._config = config
+
+        # 结构哈希，由`m2h.diff.tree_hash`在树完成后计算并缓存
+        self._hash = None
+
+    def set_config(self, config: Config):
         r"""
-        设置配置选项
+        设置配置选项，仅作用于当前节点及之后由其创建的节点
         """
-        # 配置
-        MarkDownNode._config = config
+        self._config = config
 
     @property
     def _open_tag(self):
         r"""
         标签开始：<tag ?=?>
         """
-        return (
-            "<"
-            + self._tag
-            + "".join(
-                [" " + str(k) + "=" + '"' + str(v) + '"' for k, v in self._attr.items()]
-            )
-            + ">"
-        ) * self._level
+        return render_tag(self._tag, self._attr, ">") * self._level
 
     @property
     def _self_close_tag(self):
         r"""
         自闭合标签：<tag ?=? />
         """
-        return (
-            "<"
-            + self._tag
-            + "".join(
-                [" " + str(k) + "=" + '"' + str(v) + '"' for k, v in self._attr.items()]
-            )
-            + "/>"
-        )
+        return render_tag(self._tag, self._attr, "/>")
 
     @property
     def _close_tag(self):
@@ -116,29 +143,30 @@ class MarkDownNode:
     @property
     def _last_child(self):
         r"""
-        获取最后一个孩子，不存在返回一个标签为`__unknown__`的节点（乐
+        获取最后一个孩子，不存在或为文本时返回一个标签为`__unknown__`的节点（乐
         """
-        return (
-            self._children[-1]
-            if len(self._children) != 0
-            else MarkDownNode(tag="__unknown__")
-        )
+        if len(self._children) != 0:
+            last = self._children[-1]
+            if type(last) != str:
+                return last
+        return MarkDownNode(tag="__unknown__")
 
     def _remove_last(self):
         self._children.pop()
 
     def _append_child(self, child: Node):
         r"""
-        添加孩子，并设置孩子的父亲为该节点
-        :param child --MarkDownNode
+        添加孩子，并设置孩子的父亲为该节点；文本直接以str保存
+        :param child --MarkDownNode or str
         """
         if type(child) == str:
-            if self._attr.get("class", None) == self._config.get("code_attr").get(
-                "class", "undefined"
-            ):
-                child = MarkDownNode(tag="code", children=[child])
+            if self._attr.get("class", None) == self._config.profile.code_class:
+                child = MarkDownNode(
+                    tag="code", children=[child], config=self._config
+                )
             else:
-                child = MarkDownNode(tag="__string__", children=[child])
+                self._children.append(child)
+                return
 
         child._parent = self
         self._children.append(child)
@@ -151,6 +179,8 @@ class MarkDownNode:
 
         :param value --可选择['test1 test2...', ...]
         """
+        # 属性字典可能与配置或其他节点共享，写时复制
+        self._attr = dict(self._attr)
         self._attr[key] = value
 
     def _get_attribute(self, key):
@@ -164,61 +194,38 @@ class MarkDownNode:
         :param md_text --输入一段markdown文本
         :return html:str --输出html文本
         """
-
-        # 初始化
-        self._children = []
-        curr_level = 0
-        curr_node = self
+        feeder = LineFeeder(self)
 
         # 文本切割
-        text_list = md_text.split("\n")
-        pre_text = ""
-
-        for text in text_list:
-            indent = INDENT.search(text)
-            if self.block_open:
-                curr_node._append_line(text=text + "\n", pre_text=pre_text)
-            elif self.table_open:
-                curr_node._append_line(text=text, pre_text=pre_text)
-            elif indent is None:
-                while curr_level > 0:
-                    # 递归回归至0
-                    curr_node = curr_node._parent
-                    curr_level -= 1
-                # 直接加入
-                curr_node._append_line(text=text, pre_text=pre_text)
-                # 计算level
-                curr_level = 0
-            else:
-                # 计算缩进
-                indent = indent.group()
-                level = int(indent.count(" ") / 4)
-                if level == curr_level:
-                    curr_node._append_line(text=text.lstrip(" "), pre_text=pre_text)
-                elif level - curr_level == 1:
-                    # 满足条件。新建子md
-                    # 新建子md
-                    new_node = MarkDownNode(tag="div", parent=curr_node)
-                    curr_node._append_child(new_node)
-                    curr_node = new_node
-                    curr_node._append_line(text=text.lstrip(" "), pre_text=pre_text)
-                    # 计算level
-                    curr_level = level
-                elif level > curr_level:
-                    # 超出太多，转为p标签
-                    curr_node._append_line(
-                        text=text.lstrip(" "), pre_text=pre_text, line_start=False
-                    )
-                else:
-                    # 递归回归，至level级别
-                    while level < curr_level:
-                        curr_node = curr_node._parent
-                        curr_level -= 1
-                    curr_node._append_line(text=text.lstrip(" "), pre_text=pre_text)
-            pre_text = text
+        for text in md_text.split("\n"):
+            feeder.feed(text)
 
         return self.to_html()
 
+    def convert_stream(self, lines):
+        r"""
+        流式转换，每当顶层块闭合（空行、代码区/公式区结束、表格结束）即产出html片段
+        已产出的节点会从树中移除，内存占用只与当前未闭合的块有关
+        :param lines --文件对象或任意行迭代器，行尾的`\n`可有可无
+        :return generator --依次产出的html片段，拼接后与`convert`的结果一致
+        """
+        feeder = LineFeeder(self)
+        yield self._open_tag
+
+        # 与`split("\n")`保持一致：空输入或以换行结尾时补一个空行
+        ended = True
+        for line in lines:
+            ended = line.endswith("\n")
+            closed = feeder.feed(line[:-1] if ended else line)
+            if closed or feeder.pending():
+                chunk = feeder.flush()
+                if chunk:
+                    yield chunk
+        if ended:
+            feeder.feed("")
+
+        yield feeder.flush(last=True) + self._close_tag
+
     def _append_line(
         self,
         text: str,
@@ -235,98 +242,313 @@ class MarkDownNode:
         # 当前节点指向
         node_ptr = self if parent is None else parent
 
-        if line_start is True:
-            # 预处理块级
-            if Compiler.extract_enter(node_ptr, text):
-                return
+        # 开启性能统计时改由计时版本处理
+        stats = PROFILE.get()
+        if stats is not None:
+            stats.append_line(node_ptr, text, pre_text, line_start)
+            return
 
-            # 解析代码块
-            if Compiler.extract_code(node_ptr, text):
-                return
+        # 解析块级
+        if line_start is True and Compiler.extract_block_line(
+            node_ptr, text, pre_text
+        ):
+            return
 
-            # 解析数学公式
-            if Compiler.extract_formula(node_ptr, text):
-                return
+        # 解析内嵌标识：图片、链接、粗体、斜体、内嵌代码、内嵌公式
+        node_ptr._append_child(node_ptr._render_inline(text))
 
-            # 解析table
-            if Compiler.extract_table(node_ptr, text, pre_text):
-                return
+    def _render_inline(self, text: str) -> str:
+        r"""
+        解析文本中的内嵌标识，按配置经由内嵌解析缓存；安全模式下同时转义
+        """
+        profile = self._config.profile
+        if profile.safe_mode:
+            extract = Compiler.extract_inline_safe
+        else:
+            extract = Compiler.extract_inline
+        memo = profile.inline_memo
+        # 构建章节索引时每处链接都须经过解析，不走缓存
+        if memo is False or SECTION_INDEX.get() is not None:
+            return extract(self, text)
+        return INLINE_MEMO.render(self, text, memo is True, extract)
+
+    def _inline_renderer(self):
+        r"""
+        当前上下文中的内嵌解析函数，开启性能统计时为计时版本；
+        供一次解析多段文本（如表格一行的各单元格）时只取一次
+        """
+        stats = PROFILE.get()
+        if stats is None:
+            return self._render_inline
+        return partial(stats.render_inline, self)
 
-            # 预检查block
-            if Compiler.extract_block(node_ptr, text):
-                return
+    def to_html(self, out=None):
+        r"""
+        获得当前转换的html文本格式
+        使用显式栈遍历，深层嵌套不受递归深度限制
+        :param out --可选的可写文件对象，给定时分批直接写入并返回None
+        """
+        parts = []
+        stack = [self]
+        pop = stack.pop
+        push = stack.append
+        extend = stack.extend
+        ignore_set = self.IGNORE_SET
+        while stack:
+            node = pop()
+            if type(node) == str:
+                parts.append(node)
+            elif node.self_close:
+                parts.append(node._self_close_tag)
+            elif node._tag in ignore_set:
+                extend(reversed(node._children))
+            else:
+                parts.append(node._open_tag)
+                push(node._close_tag)
+                extend(reversed(node._children))
+            if out is not None and len(parts) >= WRITE_BATCH:
+                out.write("".join(parts))
+                parts.clear()
+
+        if out is None:
+            return "".join(parts)
+        if parts:
+            out.write("".join(parts))
 
-            # 解析标题
-            if Compiler.extract_title(node_ptr, text):
-                return
+    def to_dict(self):
+        r"""
+        获得以当前节点为祖节点的dom树，使用显式栈遍历
+        文本孩子输出为`{"tag": "__string__", "attr": {}, "children": [text]}`，
+        code节点内的文本原样输出；属性字典为副本，节点间共享的属性
+        （`EMPTY_ATTR`、配置中的属性、对齐属性）不会被调用方对dom树的修改改动
+        """
+        result = []
+        # (节点, 所属的children列表, 文本是否原样输出)
+        stack = [(self, result, False)]
+        while stack:
+            node, siblings, raw = stack.pop()
+            if type(node) == str:
+                if not raw:
+                    node = {"tag": self.STRING, "attr": {}, "children": [node]}
+                siblings.append(node)
+            elif node.self_close:
+                siblings.append({"tag": node._tag, "attr": dict(node._attr)})
+            else:
+                children = []
+                siblings.append(
+                    {"tag": node._tag, "attr": dict(node._attr), "children": children}
+                )
+                raw = node._tag in self.RAW_TEXT_SET
+                stack.extend([(_c, children, raw) for _c in reversed(node._children)])
+        return result[0]
 
-            # 解析列表
-            if Compiler.extract_ul_ol(node_ptr, text):
-                return
+    def __str__(self) -> str:
+        return self._open_tag
 
-            # 解析内嵌注释
-            if Compiler.extract_comment(node_ptr, text):
-                return
 
-            # 解析横线
-            if Compiler.extract_line(node_ptr, text):
-                return
+def create_root(config: Config) -> MarkDownNode:
+    r"""
+    按配置创建一棵新树的根节点
+    """
+    profile = config.profile
+    return MarkDownNode(
+        tag=profile.markdown_tag, attr=profile.markdown_attr, config=config
+    )
+
 
-        # 解析图片
-        text = Compiler.extract_image(text)
+class LineFeeder:
+    r"""
+    逐行解析：维护当前节点、缩进层级与上一行文本，每次喂入一行
+    >>> root = MarkDownNode(tag="div")
+    >>> feeder = LineFeeder(root)
+    >>> feeder.feed("# title")
+    """
 
-        # 解析链接
-        text = Compiler.extract_link(text)
+    def __init__(self, root: MarkDownNode):
+        # 初始化
+        root._children = []
+        self.root = root
+        self.curr_node = root
+        self.curr_level = 0
+        self.pre_text = ""
+        # 开始标签已经输出、行仍在继续的顶层表格
+        self.open_table = None
+
+    def feed(self, text: str) -> bool:
+        r"""
+        解析一行文本（不含换行符）
+        :param text --当前行的文本
+        :return bool --该行之后顶层块是否闭合
+        """
+        # CRLF换行留下的行尾\r不属于文本
+        if text[-1:] == "\r":
+            text = text[:-1]
+        root = self.root
+        curr_node = self.curr_node
+        curr_level = self.curr_level
+        pre_text = self.pre_text
+        was_open = root.block_open or root.table_open
+
+        indent = INDENT.search(text)
+        if root.block_open:
+            curr_node._append_line(text=text + "\n", pre_text=pre_text)
+        elif root.table_open:
+            curr_node._append_line(text=text, pre_text=pre_text)
+        elif indent is None:
+            while curr_level > 0:
+                # 递归回归至0
+                curr_node = curr_node._parent
+                curr_level -= 1
+            # 直接加入
+            curr_node._append_line(text=text, pre_text=pre_text)
+            # 计算level
+            curr_level = 0
+        else:
+            # 计算缩进
+            indent = indent.group()
+            level = int(indent.count(" ") / 4)
+            if level == curr_level:
+                curr_node._append_line(text=text.lstrip(" "), pre_text=pre_text)
+            elif level - curr_level == 1:
+                # 满足条件。新建子md
+                new_node = MarkDownNode(
+                    tag="div", parent=curr_node, config=curr_node._config
+                )
+                curr_node._append_child(new_node)
+                curr_node = new_node
+                curr_node._append_line(text=text.lstrip(" "), pre_text=pre_text)
+                # 计算level
+                curr_level = level
+            elif level > curr_level:
+                # 超出太多，转为p标签
+                curr_node._append_line(
+                    text=text.lstrip(" "), pre_text=pre_text, line_start=False
+                )
+            else:
+                # 递归回归，至level级别
+                while level < curr_level:
+                    curr_node = curr_node._parent
+                    curr_level -= 1
+                curr_node._append_line(text=text.lstrip(" "), pre_text=pre_text)
 
-        # 解析粗体
-        text = Compiler.extract_bold(text)
+        self.curr_node = curr_node
+        self.curr_level = curr_level
+        self.pre_text = text
+        return not (root.block_open or root.table_open) and (was_open or text == "")
 
-        # 解析斜体
-        text = Compiler.extract_italic(text)
+    def pending(self) -> bool:
+        r"""
+        根节点下积压的孩子，或未闭合的顶层表格中已完成的行，是否超过`FLUSH_SIZE`
+        """
+        children = self.root._children
+        if len(children) > FLUSH_SIZE:
+            return True
+        return self.root.table_open and len(children[-1]._children) > FLUSH_SIZE
 
-        # 解析内嵌代码
-        text = Compiler.extract_inner_code(
-            node_ptr,
-            text,
-        )
-        # 解析内嵌数学公式
-        text = Compiler.extract_inner_formula(node_ptr, text)
-        node_ptr._append_child(text)
+    def flush(self, last: bool = False) -> str:
+        r"""
+        输出并移除根节点下已闭合的孩子
+        最后一个孩子可能被后续行继续使用（列表、注释延续，表头回退），默认保留；
+        仍未闭合的顶层表格先输出开始标签与已完成的行，结束标签随表格闭合后输出
+        :param last --为True时输出全部孩子
+        """
+        return "".join(self.iter_flush(last))
 
-    def to_html(self):
+    def iter_flush(self, last: bool = False):
         r"""
-        获得当前转换的html文本格式
+        与`flush`相同，但逐个顶层孩子产出html，调用方可在其间让出；
+        须迭代到结束，已闭合的孩子在最后才从树中移除
         """
-        if self.self_close:
-            return self._self_close_tag
+        children = self.root._children
+        end = len(children) if last else len(children) - 1
+        for _c in children[: max(end, 0)]:
+            if type(_c) == str:
+                yield _c
+            elif _c is self.open_table:
+                yield self._table_rows(_c) + _c._close_tag
+                self.open_table = None
+            else:
+                yield _c.to_html()
+        if end > 0:
+            del children[:end]
 
-        if self._tag in self.IGNORE_SET:
-            return "".join(
-                [_c if type(_c) == str else _c.to_html() for _c in self._children]
-            )
-        else:
-            return (
-                self._open_tag
-                + "".join(
-                    [_c if type(_c) == str else _c.to_html() for _c in self._children]
-                )
-                + self._close_tag
-            )
+        if not last and self.root.table_open:
+            table = children[-1]
+            if table is not self.open_table:
+                yield table._open_tag
+                self.open_table = table
+            yield self._table_rows(table)
 
-    def to_dict(self):
+    @staticmethod
+    def _table_rows(table: MarkDownNode) -> str:
         r"""
-        获得以当前节点为祖节点的dom树
+        输出并移除表格中已有的行
         """
-        if self.self_close:
-            return {"tag": self._tag, "attr": self._attr}
-        else:
-            return {
-                "tag": self._tag,
-                "attr": self._attr,
-                "children": [
-                    _c if type(_c) == str else _c.to_dict() for _c in self._children
-                ],
-            }
+        html = "".join([_c.to_html() for _c in table._children])
+        table._children.clear()
+        return html
 
-    def __str__(self) -> str:
-        return self._open_tag
+
+class NodeView:
+    r"""
+    节点树的只读视图：按(tag, attr, children)遍历MarkDownNode，不复制也不构建dict
+    与`to_dict`不同，文本孩子直接以str给出
+    >>> tag, attr, children = NodeView(root)
+    >>> for child in children:
+    ...     if isinstance(child, str):
+    ...         ...
+    """
+
+    __slots__ = ("_node",)
+
+    def __init__(self, node: MarkDownNode):
+        self._node = node
+
+    @property
+    def tag(self) -> str:
+        return self._node._tag
+
+    @property
+    def attr(self) -> MappingProxyType:
+        return MappingProxyType(self._node._attr)
+
+    @property
+    def children(self):
+        r"""
+        依次产出孩子的视图或文本
+        """
+        for _c in self._node._children:
+            yield _c if type(_c) == str else NodeView(_c)
+
+    @property
+    def self_close(self) -> bool:
+        return self._node.self_close
+
+    def walk(self):
+        r"""
+        先序遍历整棵子树，产出(深度, 视图或文本)，使用显式栈
+        """
+        stack = [(0, self)]
+        while stack:
+            depth, item = stack.pop()
+            yield depth, item
+            if type(item) != str:
+                stack.extend(
+                    [
+                        (depth + 1, _c if type(_c) == str else NodeView(_c))
+                        for _c in reversed(item._node._children)
+                    ]
+                )
+
+    def __iter__(self):
+        return iter((self.tag, self.attr, self.children))
+
+    def __len__(self) -> int:
+        return len(self._node._children)
+
+    def __getitem__(self, idx: int):
+        _c = self._node._children[idx]
+        return _c if type(_c) == str else NodeView(_c)
+
+    def __repr__(self) -> str:
+        return "NodeView(%s)" % self._node._open_tag
@@ -0,0 +1,148 @@
+import threading
+from collections import OrderedDict
+
+from m2h.compiler import Compiler
+
+# 内嵌解析结果缓存的条目数上限
+INLINE_MEMO_SIZE = 8192
+# 超过该字符数的文本不缓存：长行很少重复，缓存只会占用内存
+MEMO_MAX_TEXT = 512
+
+
+class InlineMemo:
+    r"""
+    内嵌解析结果的LRU缓存，以(渲染模板, 行文本)为键；取值相同的配置共享同一渲染模板，
+    模板即配置指纹
+    自动模式下每`window`次查找统计一次命中率，低于`min_hit_rate`时暂停缓存，
+    跳过之后的`window * backoff`行再重新试探；不重复的正文因此几乎不付出查找的开销
+
+    :example
+    >>> from m2h.memo import INLINE_MEMO
+    >>> INLINE_MEMO.stats()
+    {'hits': 1480, 'misses': 620, 'bypassed': 0, 'evictions': 0, 'entries': 620, ...}
+    """
+
+    def __init__(
+        self,
+        maxsize: int = INLINE_MEMO_SIZE,
+        window: int = 1024,
+        min_hit_rate: float = 0.5,
+        backoff: int = 32,
+    ):
+        r"""
+        :param maxsize --最多保存的条目数
+        :param window --自动模式下统计命中率的查找次数；窗口较小，
+            不重复的文档在开头的一个窗口后即暂停
+        :param min_hit_rate --自动模式下继续缓存所需的最低命中率；一次查找加写入的开销
+            约为解析一行的一半，命中率低于一半时缓存得不偿失
+        :param backoff --命中率不足时暂停的行数，以`window`为单位
+        """
+        self.maxsize = maxsize
+        self.window = window
+        self.min_hit_rate = min_hit_rate
+        self.backoff = backoff
+
+        self._entries = OrderedDict()
+        # 只保护stats与clear，查找路径不加锁
+        self._lock = threading.Lock()
+        # 自动模式下剩余跳过的行数
+        self._skip = 0
+        self._window_hits = 0
+        self._window_lookups = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.pauses = 0
+
+    def render(
+        self, parent, text: str, always: bool = False, extract=Compiler.extract_inline
+    ) -> str:
+        r"""
+        与`extract`相同，结果经缓存
+        查找路径不加锁：OrderedDict的单个操作在GIL下是原子的，多线程并发时
+        只有统计计数可能略有出入
+        :param parent --当前文本所属父节点
+        :param text --当前行的文本
+        :param always --为True时不论命中率始终缓存，否则按自动模式
+        :param extract --内嵌解析函数，安全模式下为`Compiler.extract_inline_safe`；
+            键中的渲染模板已区分是否安全模式
+        """
+        if len(text) > MEMO_MAX_TEXT:
+            return extract(parent, text)
+        if self._skip > 0 and not always:
+            self._skip -= 1
+            self.bypassed += 1
+            return extract(parent, text)
+
+        entries = self._entries
+        key = (parent._config.profile, text)
+        html = entries.get(key)
+        if html is not None:
+            try:
+                entries.move_to_end(key)
+            except KeyError:
+                # 已被其他线程淘汰
+                pass
+            self.hits += 1
+            self._window_hits += 1
+        else:
+            html = extract(parent, text)
+            entries[key] = html
+            if len(entries) > self.maxsize:
+                try:
+                    entries.popitem(last=False)
+                    self.evictions += 1
+                except KeyError:
+                    pass
+            self.misses += 1
+
+        self._window_lookups += 1
+        if self._window_lookups >= self.window:
+            self._end_window(always)
+        return html
+
+    def _end_window(self, always: bool):
+        r"""
+        窗口结束：自动模式下命中率不足时暂停缓存
+        """
+        if not always and self._window_hits < self.window * self.min_hit_rate:
+            self._skip = self.window * self.backoff
+            self.pauses += 1
+        self._window_hits = 0
+        self._window_lookups = 0
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        r"""
+        命中、未命中、暂停期间跳过的行数、淘汰数、当前条目数、累计暂停次数与命中率
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "pauses": self.pauses,
+                "paused": self._skip > 0,
+                "hit_rate": self.hit_rate(),
+            }
+
+    def clear(self):
+        r"""
+        清空缓存与统计
+        """
+        with self._lock:
+            self._entries.clear()
+            self._skip = self._window_hits = self._window_lookups = 0
+            self.hits = self.misses = self.bypassed = 0
+            self.evictions = self.pauses = 0
+
+
+# 进程内共享的内嵌解析缓存
+INLINE_MEMO = InlineMemo()
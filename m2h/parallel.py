@@ -0,0 +1,112 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from m2h.config import Config
+from m2h.mdNode import LineFeeder, create_root
+
+# 每段至少包含的字符数，过小的段进程间传输的开销大于解析
+MIN_CHUNK = 64 << 10
+
+
+def split_chunks(lines: list, parts: int, min_chunk: int = MIN_CHUNK) -> list:
+    r"""
+    按顶层块边界把行切分为至多`parts`段，各段字符数大致相等
+    段首为不在代码区/公式区内的空行（首段从第0行开始）；代码区/公式区只按行首的
+    "```"与"$$"粗略判断，判断有误时由`convert_parallel`校验后串行重解析
+    :return list --各段的(起始行, 结束行)，左闭右开
+    """
+    total = sum(map(len, lines)) + len(lines)
+    target = max(total // max(parts, 1), min_chunk)
+
+    bounds = [0]
+    size = 0
+    fence = None
+    for i, text in enumerate(lines):
+        if text == "":
+            if fence is None and size >= target:
+                bounds.append(i)
+                size = 0
+        else:
+            head = text.lstrip(" ")[:3]
+            if fence is None:
+                if head == "```":
+                    fence = "```"
+                elif head[:2] == "$$":
+                    fence = "$$"
+            elif head.startswith(fence):
+                fence = None
+        size += len(text) + 1
+    bounds.append(len(lines))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _children_html(root) -> str:
+    return "".join([_c if type(_c) == str else _c.to_html() for _c in root._children])
+
+
+def convert_chunk(config: Config, text: str) -> tuple:
+    r"""
+    在工作进程中解析一段，假定其开头处于顶层块边界
+    :return (html, block_open) --根节点下各孩子的html，以及段末是否仍在代码区/公式区内
+    """
+    root = create_root(config)
+    feeder = LineFeeder(root)
+    for line in text.split("\n"):
+        feeder.feed(line)
+    return _children_html(root), root.block_open
+
+
+def convert_parallel(
+    config: Config,
+    markdown_text: str,
+    workers: int = None,
+    executor=None,
+    min_chunk: int = MIN_CHUNK,
+) -> str:
+    r"""
+    把文档按顶层块切分后在进程池中分段解析，按顺序拼接，结果与串行`convert`逐字节一致
+    前一段结束时仍在代码区/公式区内，说明后一段的段首并非真正的块边界，
+    此时从前一段起串行接着解析，直到段首重新对齐
+    :param config --配置
+    :param markdown_text --输入的文本
+    :param workers --进程数，默认为cpu数
+    :param executor --可复用的进程池，为None时临时创建
+    :param min_chunk --每段至少包含的字符数
+    """
+    workers = workers or os.cpu_count() or 1
+    lines = markdown_text.split("\n")
+    # 每个进程分到若干段，减少段大小不均的影响
+    chunks = split_chunks(lines, workers * 4, min_chunk)
+    root = create_root(config)
+    if len(chunks) < 2:
+        return root.convert(markdown_text)
+
+    texts = ["\n".join(lines[begin:end]) for begin, end in chunks]
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(convert_chunk, repeat(config), texts))
+    else:
+        results = list(executor.map(convert_chunk, repeat(config), texts))
+
+    htmls = []
+    i = 0
+    while i < len(results):
+        html, block_open = results[i]
+        if not block_open or i + 1 == len(results):
+            htmls.append(html)
+            i += 1
+            continue
+
+        # 串行重解析第i段及其后的段，直到某段结束时不在代码区/公式区内
+        serial = create_root(config)
+        feeder = LineFeeder(serial)
+        while i < len(results):
+            for line in texts[i].split("\n"):
+                feeder.feed(line)
+            i += 1
+            if not serial.block_open:
+                break
+        htmls.append(_children_html(serial))
+
+    return root._open_tag + "".join(htmls) + root._close_tag
@@ -0,0 +1,216 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from m2h.compiler import BLOCK_HANDLERS, Compiler
+
+# 当前上下文中生效的统计对象，为None时不做任何统计
+PROFILE = ContextVar("m2h_profile", default=None)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class ConvertStats:
+    r"""
+    转换过程的性能统计：各解析函数的调用次数与耗时、正则命中次数、各标签节点数、
+    各阶段耗时与输入输出字节数
+    解析函数的耗时包含其内部嵌套调用（如标题内的内嵌解析）的耗时
+    同一统计对象可累计多次转换；统计对象本身不加锁，并发转换时应各用一个
+
+    :example
+    >>> md = MarkDown()
+    >>> md.convert(text, profile=True)
+    >>> md.get_stats().to_dict()
+    >>> # or，累计多次转换
+    >>> stats = ConvertStats()
+    >>> for text in texts:
+    ...     md.convert(text, profile=stats)
+    >>> print(stats.to_prometheus())
+    >>> # or，统计上下文中的全部转换（含update、convert_stream）
+    >>> with ConvertStats() as stats:
+    ...     md.update((3, 4), "new line")
+    """
+
+    def __init__(self):
+        self.conversions = 0
+        self.cache_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # 函数名 -> 调用次数 / 累计秒数 / 返回真值（即已处理该行）的次数
+        self.calls = Counter()
+        self.seconds = Counter()
+        self.matches = Counter()
+        # 内嵌标识的正则分组名 -> 命中次数
+        self.inline_matches = Counter()
+        # 标签 -> 节点数
+        self.nodes = Counter()
+        # 阶段 -> 累计秒数
+        self.stages = Counter()
+
+        self.handlers = {
+            name: self._timed(name, handler)
+            for name, handler in BLOCK_HANDLERS.items()
+            if name != "dispatch"
+        }
+        wrapped = {}
+        self.handlers["dispatch"] = {
+            head: tuple(
+                wrapped.setdefault(f.__name__, self._timed(f.__name__, f))
+                for f in funcs
+            )
+            for head, funcs in BLOCK_HANDLERS["dispatch"].items()
+        }
+        self._tokens = []
+
+    def _timed(self, name: str, func):
+        r"""
+        包装解析函数，累计调用次数、耗时与命中次数
+        """
+        calls, seconds, matches = self.calls, self.seconds, self.matches
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            result = func(*args)
+            seconds[name] += clock() - start
+            calls[name] += 1
+            if result:
+                matches[name] += 1
+            return result
+
+        return timed
+
+    def append_line(self, node_ptr, text: str, pre_text: str, line_start: bool):
+        r"""
+        `MarkDownNode._append_line`的计时版本
+        """
+        if line_start is True:
+            start = time.perf_counter()
+            done = Compiler.extract_block_line(node_ptr, text, pre_text, self.handlers)
+            self.seconds["extract_block_line"] += time.perf_counter() - start
+            self.calls["extract_block_line"] += 1
+            if done:
+                self.matches["extract_block_line"] += 1
+                return
+
+        node_ptr._append_child(self.render_inline(node_ptr, text))
+
+    def render_inline(self, node_ptr, text: str) -> str:
+        r"""
+        `MarkDownNode._render_inline`的计时版本，按种类累计内嵌标识的命中次数；
+        行内文本与表格单元格都经由这里
+        """
+        start = time.perf_counter()
+        if node_ptr._config.profile.safe_mode:
+            extract = Compiler.extract_inline_safe
+        else:
+            extract = Compiler.extract_inline
+        html = extract(node_ptr, text, self.inline_matches)
+        self.seconds["extract_inline"] += time.perf_counter() - start
+        self.calls["extract_inline"] += 1
+        if html is not text:
+            self.matches["extract_inline"] += 1
+        return html
+
+    def stage(self, name: str, seconds: float):
+        self.stages[name] += seconds
+
+    def count_nodes(self, root):
+        r"""
+        遍历节点树，按标签累计节点数；文本叶子计为`__string__`
+        """
+        nodes = self.nodes
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if type(node) == str:
+                nodes[root.STRING] += 1
+            else:
+                nodes[node._tag] += 1
+                stack.extend(node._children)
+
+    def __enter__(self):
+        self._tokens.append(PROFILE.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        PROFILE.reset(self._tokens.pop())
+
+    def to_dict(self) -> dict:
+        return {
+            "conversions": self.conversions,
+            "cache_hits": self.cache_hits,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "stages": dict(self.stages),
+            "functions": {
+                name: {
+                    "calls": self.calls[name],
+                    "seconds": self.seconds[name],
+                    "matches": self.matches[name],
+                }
+                for name in sorted(self.calls)
+            },
+            "inline_matches": dict(self.inline_matches),
+            "nodes": dict(self.nodes),
+        }
+
+    def to_prometheus(self, prefix: str = "m2h") -> str:
+        r"""
+        导出为Prometheus文本格式，全部指标均为counter
+        :param prefix --指标名前缀
+        """
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append("# HELP %s_%s %s" % (prefix, name, help_text))
+            lines.append("# TYPE %s_%s counter" % (prefix, name))
+            for labels, value in samples:
+                label_text = ",".join(
+                    '%s="%s"' % (k, _escape_label(str(v))) for k, v in labels
+                )
+                if label_text:
+                    label_text = "{%s}" % label_text
+                lines.append("%s_%s%s %s" % (prefix, name, label_text, value))
+
+        metric("conversions_total", "Conversions.", [((), self.conversions)])
+        metric(
+            "cache_hits_total",
+            "Conversions served from cache.",
+            [((), self.cache_hits)],
+        )
+        metric("input_bytes_total", "Markdown bytes read.", [((), self.bytes_in)])
+        metric("output_bytes_total", "HTML bytes emitted.", [((), self.bytes_out)])
+        metric(
+            "stage_seconds_total",
+            "Time spent per pipeline stage.",
+            [((("stage", k),), repr(v)) for k, v in sorted(self.stages.items())],
+        )
+        metric(
+            "calls_total",
+            "Calls per parse function.",
+            [((("function", k),), v) for k, v in sorted(self.calls.items())],
+        )
+        metric(
+            "function_seconds_total",
+            "Time per parse function, including nested calls.",
+            [((("function", k),), repr(self.seconds[k])) for k in sorted(self.calls)],
+        )
+        metric(
+            "matches_total",
+            "Lines handled per parse function.",
+            [((("function", k),), self.matches[k]) for k in sorted(self.calls)],
+        )
+        metric(
+            "inline_matches_total",
+            "Inline regex matches per group.",
+            [((("group", k),), v) for k, v in sorted(self.inline_matches.items())],
+        )
+        metric(
+            "nodes_total",
+            "Nodes in the parsed tree per tag.",
+            [((("tag", k),), v) for k, v in sorted(self.nodes.items())],
+        )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,49 @@
+r"""
+常驻服务的帧格式：4字节大端长度 + utf-8编码的json对象
+
+请求：{"id": int, "markdown": str, "config": dict | None, "dom": bool}
+响应：{"id": int, "html": str, "dom": dict}，dom仅在请求时给出；
+出错时为{"id": int, "error": str}
+同一连接上可连续发送多个请求而不等待响应（流水线），响应按请求顺序返回
+"""
+import json
+import struct
+
+HEADER = struct.Struct("!I")
+
+# 单帧长度上限，超过时服务端回复错误并关闭连接
+MAX_FRAME = 64 << 20
+
+
+def encode_frame(message: dict) -> bytes:
+    body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    if len(body) > MAX_FRAME:
+        raise ValueError("frame of %d bytes exceeds the limit" % len(body))
+    return HEADER.pack(len(body)) + body
+
+
+def next_frame(buffer: bytearray):
+    r"""
+    从缓冲区头部取出一个完整的帧，返回其json文本的字节，尚不完整时返回None
+    长度超过上限时抛出ValueError，此后缓冲区中的内容已无法对齐
+    """
+    if len(buffer) < HEADER.size:
+        return None
+    (size,) = HEADER.unpack_from(buffer)
+    if size > MAX_FRAME:
+        raise ValueError("frame of %d bytes exceeds the limit" % size)
+    end = HEADER.size + size
+    if len(buffer) < end:
+        return None
+    body = bytes(buffer[HEADER.size : end])
+    del buffer[:end]
+    return body
+
+
+def has_frame(buffer: bytearray) -> bool:
+    r"""
+    缓冲区中是否已有一个完整的帧
+    """
+    if len(buffer) < HEADER.size:
+        return False
+    return len(buffer) >= HEADER.size + HEADER.unpack_from(buffer)[0]
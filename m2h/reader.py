@@ -0,0 +1,110 @@
+import codecs
+import mmap
+import os
+import re
+
+# 按字节查找换行，适用于bytes、bytearray、memoryview与mmap
+NEWLINE = re.compile(rb"\n")
+
+# 每读过该字节数，释放一次已读部分在本进程中映射的页
+RELEASE_SIZE = 8 << 20
+
+# 与ascii不兼容的编码的BOM，较长的在前
+WIDE_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def detect_bom(data, encoding: str) -> tuple:
+    r"""
+    根据开头的BOM确定编码
+    :param data --字节缓冲区
+    :param encoding --没有BOM时使用的编码
+    :return (encoding, offset) --实际编码与正文的起始字节；utf-16/32的BOM留给解码器处理
+    """
+    head = bytes(data[:4])
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8", len(codecs.BOM_UTF8)
+    for bom, name in WIDE_BOMS:
+        if head.startswith(bom):
+            return name, 0
+    return encoding, 0
+
+
+def iter_buffer_lines(data, encoding: str = "utf-8", release=None):
+    r"""
+    在字节缓冲区中查找换行，逐行解码产出，不生成整篇的str
+    开头的BOM决定实际编码；utf-16、utf-32等与ascii不兼容的编码无法按字节查找换行，
+    整体解码后再切分
+    :param data --bytes、bytearray、memoryview或mmap
+    :param encoding --没有BOM时使用的编码
+    :param release --可选的回调`release(start, end)`，通知[start, end)字节已经读过
+    :return generator --带行尾`\n`的各行文本，最后一行没有换行时不带
+
+    :example
+    >>> list(iter_buffer_lines(b"\xef\xbb\xbf# title\r\ntext"))
+    ['# title\r\n', 'text']
+    """
+    if isinstance(data, memoryview) and data.format != "B":
+        data = data.cast("B")
+    encoding, pos = detect_bom(data, encoding)
+
+    if "\n".encode(encoding) != b"\n":
+        lines = str(data, encoding).split("\n")
+        for line in lines[:-1]:
+            yield line + "\n"
+        if lines[-1]:
+            yield lines[-1]
+        return
+
+    size = len(data)
+    search = NEWLINE.search
+    released = 0
+    while pos < size:
+        m = search(data, pos)
+        end = size if m is None else m.end()
+        yield str(data[pos:end], encoding)
+        pos = end
+
+        if release is not None and pos - released >= RELEASE_SIZE:
+            release(released, pos)
+            released = pos
+
+
+def iter_lines(path, encoding: str = "utf-8"):
+    r"""
+    以内存映射读取文件，逐行解码产出
+    文件内容不会整体读入内存；已读部分的页定期释放，常驻内存与文件大小无关
+    :param path --文件路径
+    :param encoding --没有BOM时使用的编码
+    :return generator --同`iter_buffer_lines`
+
+    :example
+    >>> for line in iter_lines("doc.md"):
+    ...     feeder.feed(line.rstrip("\n"))
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # madvise只在部分平台上可用
+            advise = getattr(mm, "madvise", None)
+            dontneed = getattr(mmap, "MADV_DONTNEED", None)
+            if advise is not None and hasattr(mmap, "MADV_SEQUENTIAL"):
+                advise(mmap.MADV_SEQUENTIAL)
+
+            release = None
+            if advise is not None and dontneed is not None:
+
+                def release(start, end):
+                    # 按页对齐释放已读部分，页仍保留在系统的文件缓存中
+                    start -= start % mmap.PAGESIZE
+                    end -= end % mmap.PAGESIZE
+                    if end > start:
+                        advise(dontneed, start, end - start)
+
+            yield from iter_buffer_lines(mm, encoding, release)
@@ -0,0 +1,253 @@
+import json
+import os
+import re
+
+from m2h.compiler import SECTION_INDEX
+from m2h.config import Config
+from m2h.mdNode import LineFeeder, create_root
+from m2h.reader import detect_bom, iter_lines
+
+INDEX_VERSION = 1
+
+# 生成slug时去掉的内嵌标识：链接/图片只保留文字，其余标识字符删除
+SLUG_LINK = re.compile(r"!?\[([^\[]*)\]\([^\(]*\)")
+SLUG_DROP = re.compile(r"[^\w\- ]")
+
+
+def slugify(title: str) -> str:
+    r"""
+    标题文本转为slug：去掉内嵌标识与标点，小写，空格换为`-`
+    >>> slugify("Install **m2h** on [Linux](linux.md)")
+    'install-m2h-on-linux'
+    """
+    text = SLUG_LINK.sub(r"\1", title)
+    text = SLUG_DROP.sub("", text).strip().lower()
+    return re.sub(r" +", "-", text)
+
+
+def _keep_ends(text: str):
+    r"""
+    按`\n`切分并保留行尾，与逐行读取文件得到的行一致
+    """
+    lines = text.split("\n")
+    for line in lines[:-1]:
+        yield line + "\n"
+    if lines[-1]:
+        yield lines[-1]
+
+
+class Section:
+    r"""
+    一个顶层标题下的章节：从标题行起，到下一个级别不低于它的标题之前
+    行号从0开始，区间左闭右开；字节区间为源文件中的偏移，由文本构建时按utf-8计算
+    """
+
+    __slots__ = ("level", "title", "slug", "start", "end", "byte_start", "byte_end")
+
+    def __init__(self, level, title, slug, start, end, byte_start, byte_end):
+        self.level = level
+        self.title = title
+        self.slug = slug
+        self.start = start
+        self.end = end
+        self.byte_start = byte_start
+        self.byte_end = byte_end
+
+    def to_list(self) -> list:
+        return [getattr(self, name) for name in self.__slots__]
+
+    def __repr__(self) -> str:
+        return "<Section h%d %r lines %d-%d>" % (
+            self.level,
+            self.slug,
+            self.start,
+            self.end,
+        )
+
+
+class SectionIndex:
+    r"""
+    章节索引：解析时由`Compiler.extract_title`收集顶层标题，同一遍中记录各处链接与图片
+    可保存为json；由文件构建的索引记录源文件路径、大小与修改时间，之后按字节区间
+    直接读取某一章节的行，不必读入整个文件
+
+    :example
+    >>> index = SectionIndex.from_file("guide.md")
+    >>> index.save("guide.index.json")
+    >>> index = SectionIndex.load("guide.index.json")
+    >>> html = MarkDown().convert_section(index, "installation")
+    """
+
+    def __init__(self, path=None, encoding: str = "utf-8"):
+        r"""
+        :param path --源文件路径，由文本构建时为None
+        :param encoding --源文件编码
+        """
+        self.path = None if path is None else os.fspath(path)
+        self.encoding = encoding
+        self.size = None
+        self.mtime_ns = None
+        self.sections = []
+        # (行号, 链接文字, 地址)与(行号, alt, 地址)
+        self.links = []
+        self.images = []
+        # 构建时的解析状态：根节点、当前行号、当前行的字节偏移
+        self.root = None
+        self.line = 0
+        self.offset = 0
+        self._headings = []
+
+    @classmethod
+    def build(
+        cls, lines, config: Config = None, path=None, encoding="utf-8", root=None
+    ):
+        r"""
+        逐行解析并收集索引，解析结果与`convert`相同
+        :param lines --markdown文本，or，带行尾换行的行迭代器
+        :param config --解析使用的配置
+        :param path --源文件路径
+        :param encoding --源文件编码，用于计算字节偏移
+        :param root --可选的根节点，解析结果留在其中
+        :return SectionIndex
+        """
+        index = cls(path, encoding)
+        if isinstance(lines, str):
+            lines = _keep_ends(lines)
+        index.root = create_root(config or Config()) if root is None else root
+        feeder = LineFeeder(index.root)
+
+        token = SECTION_INDEX.set(index)
+        try:
+            # 与`convert_stream`一致：空输入或以换行结尾时补一个空行
+            ended = True
+            for line in lines:
+                ended = line.endswith("\n")
+                feeder.feed(line[:-1] if ended else line)
+                index.line += 1
+                if line.isascii():
+                    index.offset += len(line)
+                else:
+                    index.offset += len(line.encode(encoding, "surrogatepass"))
+            if ended:
+                feeder.feed("")
+        finally:
+            SECTION_INDEX.reset(token)
+
+        index._finish()
+        return index
+
+    @classmethod
+    def from_file(cls, path, encoding: str = "utf-8", config: Config = None):
+        r"""
+        以内存映射逐行读取文件并构建索引；编码须与ascii兼容
+        """
+        with open(path, "rb") as f:
+            head = f.read(4)
+            stat = os.fstat(f.fileno())
+        encoding, start = detect_bom(head, encoding)
+        index = cls.build(iter_lines(path, encoding), config, path, encoding)
+        # 字节偏移从BOM之后算起
+        if start:
+            for section in index.sections:
+                section.byte_start += start
+                section.byte_end += start
+        index.size = stat.st_size
+        index.mtime_ns = stat.st_mtime_ns
+        return index
+
+    def add_heading(self, level: int, title: str):
+        self._headings.append((self.line, self.offset, level, title))
+
+    def add_link(self, text: str, href: str):
+        self.links.append((self.line, text, href))
+
+    def add_image(self, alt: str, src: str):
+        self.images.append((self.line, alt, src))
+
+    def _finish(self):
+        r"""
+        由收集到的标题计算各章节的行区间与字节区间，重复的slug加序号
+        """
+        total_lines = self.line
+        total_bytes = self.offset
+        headings = self._headings
+        seen = {}
+        for i, (line, offset, level, title) in enumerate(headings):
+            end, byte_end = total_lines, total_bytes
+            for next_line, next_offset, next_level, _ in headings[i + 1 :]:
+                if next_level <= level:
+                    end, byte_end = next_line, next_offset
+                    break
+            slug = slugify(title)
+            count = seen.get(slug, 0)
+            seen[slug] = count + 1
+            if count:
+                slug = "%s-%d" % (slug, count)
+            section = Section(level, title, slug, line, end, offset, byte_end)
+            self.sections.append(section)
+        self._headings = []
+        self.root = None
+
+    def find(self, slug: str) -> Section:
+        r"""
+        按slug查找章节，不存在时抛出KeyError
+        """
+        for section in self.sections:
+            if section.slug == slug:
+                return section
+        raise KeyError(slug)
+
+    def read_section(self, slug: str) -> str:
+        r"""
+        从源文件中按字节区间读取章节的文本
+        源文件的大小或修改时间与构建时不同，说明索引已过期，抛出ValueError
+        """
+        if self.path is None:
+            raise ValueError("index was not built from a file")
+        section = self.find(slug)
+        stat = os.stat(self.path)
+        if (stat.st_size, stat.st_mtime_ns) != (self.size, self.mtime_ns):
+            raise ValueError("source file changed since the index was built")
+        with open(self.path, "rb") as f:
+            f.seek(section.byte_start)
+            data = f.read(section.byte_end - section.byte_start)
+        text = data.decode(self.encoding)
+        # 与按行切片一致：不含最后一行的换行
+        if text.endswith("\n"):
+            text = text[:-1]
+        return text
+
+    def to_dict(self) -> dict:
+        return {
+            "version": INDEX_VERSION,
+            "path": self.path,
+            "encoding": self.encoding,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "sections": [section.to_list() for section in self.sections],
+            "links": [list(link) for link in self.links],
+            "images": [list(image) for image in self.images],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SectionIndex":
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(
+                "unsupported section index version %r" % data.get("version")
+            )
+        index = cls(data["path"], data["encoding"])
+        index.size = data["size"]
+        index.mtime_ns = data["mtime_ns"]
+        index.sections = [Section(*values) for values in data["sections"]]
+        index.links = [tuple(link) for link in data["links"]]
+        index.images = [tuple(image) for image in data["images"]]
+        return index
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path) -> "SectionIndex":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,367 @@
+r"""
+常驻转换服务：监听unix域套接字，主进程预热后fork出若干工作进程，共享同一个监听套接字
+工作进程以selectors同时服务多个连接，逐帧处理流水线请求；某连接待发送的响应超过
+`OUTPUT_LIMIT`时暂停读取该连接，由内核缓冲区把背压传回客户端
+收到SIGTERM/SIGINT时停止接受新连接，已开始接收的请求收完、处理并发送完毕后退出
+
+>>> python -m m2h --serve /tmp/m2h.sock --workers 4
+"""
+import gc
+import json
+import os
+import selectors
+import signal
+import socket
+import stat
+import sys
+import time
+
+from m2h.config import Config
+from m2h.protocol import encode_frame, has_frame, next_frame
+
+# 单个连接待发送的响应超过该字节数时暂停读取
+OUTPUT_LIMIT = 1 << 20
+RECV_SIZE = 1 << 16
+
+# 工作进程检查退出标志的间隔，秒
+SELECT_TIMEOUT = 0.5
+
+# 工作进程意外退出后重新fork前的等待，避免反复崩溃时空转
+RESPAWN_DELAY = 0.5
+
+# 每个工作进程缓存的配置数，超过时清空
+INSTANCE_CACHE_SIZE = 64
+
+# 预热文本：覆盖各块级与内嵌标识，fork前完成正则编译与模板渲染
+WARMUP_TEXT = """# title
+
+## sub **bold** *italic* `code` $x^2$ [link](a.md) ![img](b.png)
+
+- item
+    - nested
+1. first
+
+> quote
+
+| a | b |
+| :- | -: |
+| 1 | 2 |
+
+```python
+print(1)
+```
+
+$$
+x^2
+$$
+
+---
+"""
+
+
+class Renderer:
+    r"""
+    工作进程中的转换：按配置缓存预热过的`MarkDown`实例
+    """
+
+    def __init__(self, config_kwargs: dict = None):
+        from md import MarkDown
+
+        self._markdown = MarkDown
+        self._config_kwargs = config_kwargs or {}
+        self._instances = {}
+        self._instance(None).convert(WARMUP_TEXT)
+
+    def _instance(self, config: dict):
+        key = None if config is None else json.dumps(config, sort_keys=True)
+        md = self._instances.get(key)
+        if md is None:
+            if config is None:
+                config = self._config_kwargs
+            elif type(config) != dict:
+                raise TypeError("config must be an object")
+            if len(self._instances) >= INSTANCE_CACHE_SIZE:
+                self._instances.clear()
+            md = self._markdown(Config(**config))
+            self._instances[key] = md
+        return md
+
+    def handle(self, body: bytes) -> dict:
+        r"""
+        处理一个请求帧，输入有误或转换出错时返回带`error`的响应
+        """
+        rid = None
+        try:
+            request = json.loads(body)
+            if type(request) != dict:
+                raise TypeError("request must be an object")
+            rid = request.get("id")
+            markdown = request.get("markdown")
+            if type(markdown) != str:
+                raise TypeError("markdown must be a string")
+            md = self._instance(request.get("config"))
+            response = {"id": rid, "html": md.convert(markdown)}
+            if request.get("dom"):
+                response["dom"] = md.get_dom_tree()
+        except Exception as e:
+            # 单个请求出错不影响同一工作进程上的其他连接
+            response = {"id": rid, "error": "%s: %s" % (type(e).__name__, e)}
+        return response
+
+
+class Connection:
+    r"""
+    一个客户端连接的收发缓冲
+    """
+
+    __slots__ = ("sock", "inbuf", "outbuf", "eof", "events")
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.eof = False
+        self.events = selectors.EVENT_READ
+
+    def receive(self):
+        data = self.sock.recv(RECV_SIZE)
+        if data:
+            self.inbuf += data
+        else:
+            self.eof = True
+
+    def flush(self):
+        if self.outbuf:
+            try:
+                sent = self.sock.send(self.outbuf)
+            except BlockingIOError:
+                return
+            del self.outbuf[:sent]
+
+    def process(self, renderer: Renderer):
+        r"""
+        逐帧处理已收到的请求，待发送的响应超过上限时暂停，等发送后再继续
+        帧长度超出上限时回复错误，并视为连接结束
+        """
+        while len(self.outbuf) < OUTPUT_LIMIT:
+            try:
+                body = next_frame(self.inbuf)
+            except ValueError as e:
+                error = {"id": None, "error": "ValueError: %s" % e}
+                self.outbuf += encode_frame(error)
+                self.inbuf.clear()
+                self.eof = True
+                return
+            if body is None:
+                return
+            response = renderer.handle(body)
+            try:
+                self.outbuf += encode_frame(response)
+            except ValueError as e:
+                # 响应超出帧长度上限
+                error = {"id": response["id"], "error": "ValueError: %s" % e}
+                self.outbuf += encode_frame(error)
+
+    def wanted(self, stopping: bool) -> int:
+        r"""
+        需要关注的事件；为0时连接已无事可做，可以关闭
+        停止时只把已收到一部分的请求读完，不再读取新请求
+        """
+        events = 0
+        # 仍有请求待处理时同样关注可写，下一轮立即处理而不必等待超时
+        pending = has_frame(self.inbuf)
+        if self.outbuf or pending:
+            events |= selectors.EVENT_WRITE
+        if not self.eof and len(self.outbuf) < OUTPUT_LIMIT:
+            if not stopping or (self.inbuf and not pending):
+                events |= selectors.EVENT_READ
+        return events
+
+
+def worker_loop(listener: socket.socket, renderer: Renderer):
+    r"""
+    工作进程主循环，收到SIGTERM后停止接受新连接，处理完已有请求后返回
+    """
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    # Ctrl-C发给整个进程组，由主进程统一转为SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    connections = {}
+    accepting = True
+    while accepting or connections:
+        if stopping and accepting:
+            selector.unregister(listener)
+            listener.close()
+            accepting = False
+
+        for key, mask in selector.select(SELECT_TIMEOUT):
+            if key.fileobj is listener:
+                try:
+                    sock, _ = listener.accept()
+                except BlockingIOError:
+                    # 其他工作进程已接受该连接
+                    continue
+                sock.setblocking(False)
+                connections[sock] = Connection(sock)
+                selector.register(sock, selectors.EVENT_READ)
+                continue
+            conn = connections[key.fileobj]
+            try:
+                if mask & selectors.EVENT_WRITE:
+                    conn.flush()
+                if mask & selectors.EVENT_READ:
+                    conn.receive()
+            except OSError:
+                conn.eof = True
+                conn.inbuf.clear()
+                conn.outbuf.clear()
+
+        for sock, conn in list(connections.items()):
+            try:
+                conn.process(renderer)
+                conn.flush()
+            except OSError:
+                conn.inbuf.clear()
+                conn.outbuf.clear()
+                conn.eof = True
+            events = conn.wanted(bool(stopping))
+            if not events:
+                selector.unregister(sock)
+                sock.close()
+                del connections[sock]
+            elif events != conn.events:
+                selector.modify(sock, events)
+                conn.events = events
+    selector.close()
+
+
+def _bind(path: str, backlog: int) -> socket.socket:
+    r"""
+    在临时路径上监听后改名，套接字文件出现时即可连接
+    已有服务在该路径上监听时抛出OSError，残留的套接字文件直接替换
+    """
+    if os.path.exists(path):
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise OSError("%s exists and is not a socket" % path)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            pass
+        else:
+            raise OSError("another server is listening on %s" % path)
+        finally:
+            probe.close()
+
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        listener.bind(tmp)
+        # 仅当前用户可连接
+        os.chmod(tmp, 0o600)
+        listener.listen(backlog)
+        os.replace(tmp, path)
+    except OSError:
+        listener.close()
+        raise
+    listener.setblocking(False)
+    return listener
+
+
+def _spawn(listener: socket.socket, renderer: Renderer) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            worker_loop(listener, renderer)
+        except BaseException:
+            import traceback
+
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(
+    path: str,
+    workers: int = None,
+    config_kwargs: dict = None,
+    backlog: int = 128,
+    grace: float = 10.0,
+) -> int:
+    r"""
+    启动常驻服务，直到收到SIGTERM/SIGINT
+    :param path --unix域套接字路径
+    :param workers --工作进程数，默认为cpu数
+    :param config_kwargs --请求未给出配置时使用的`Config`参数
+    :param backlog --监听队列长度，所有工作进程都忙时新连接在此排队
+    :param grace --停止时等待工作进程处理完已有请求的秒数，超时后强制结束
+    :return int --退出码
+    """
+    workers = workers or os.cpu_count() or 1
+    # fork前预热：导入模块、编译正则与渲染模板，冻结gc使这些对象在子进程间共享页面
+    renderer = Renderer(config_kwargs)
+    gc.collect()
+    gc.freeze()
+
+    listener = _bind(path, backlog)
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    pids = set()
+    try:
+        for _ in range(workers):
+            pids.add(_spawn(listener, renderer))
+        print(
+            "m2h: serving on %s with %d workers" % (path, workers),
+            file=sys.stderr,
+            flush=True,
+        )
+
+        # 补齐意外退出的工作进程
+        while not stopping:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(SELECT_TIMEOUT)
+                continue
+            pids.discard(pid)
+            if not stopping:
+                print("m2h: worker %d exited, restarting" % pid, file=sys.stderr)
+                time.sleep(RESPAWN_DELAY)
+                pids.add(_spawn(listener, renderer))
+    finally:
+        # 先删除套接字文件，不再有新连接进入
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        listener.close()
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + grace
+        while pids and time.monotonic() < deadline:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.05)
+            else:
+                pids.discard(pid)
+        for pid in pids:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+    return 0
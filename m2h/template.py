@@ -0,0 +1,163 @@
+r"""
+标签渲染：按(tag, 属性)缓存的开始标签，以及由配置预编译的渲染模板
+安全模式下的文本转义与地址检查也在这里，解析时直接写入节点，不另做一遍
+"""
+import re
+
+# 已渲染标签缓存：(tag, 渲染后的属性, 结尾) -> "<tag k="v">"
+_TAG_CACHE = {}
+TAG_CACHE_SIZE = 4096
+
+
+def render_tag(tag: str, attr: dict, end: str) -> str:
+    r"""
+    渲染开始标签或自闭合标签，按(tag, 属性)缓存
+    缓存键中的属性取渲染后的字符串：`True`、`1`、`1.0`相等且哈希相同，按原值作键会共用一个标签
+    :param end --">"或"/>"
+    :example
+    >>> render_tag("td", {"colspan": True}, ">"), render_tag("td", {"colspan": 1}, ">")
+    ('<td colspan="True">', '<td colspan="1">')
+    """
+    if attr:
+        items = tuple([(str(k), str(v)) for k, v in attr.items()])
+        key = (tag, items, end)
+    else:
+        items = ()
+        key = (tag, end)
+    html = _TAG_CACHE.get(key)
+    if html is None:
+        html = "<" + tag + "".join([" " + k + '="' + v + '"' for k, v in items]) + end
+        if len(_TAG_CACHE) >= TAG_CACHE_SIZE:
+            _TAG_CACHE.clear()
+        _TAG_CACHE[key] = html
+    return html
+
+
+# 内容不解码实体的元素，其中的文本只需避免出现结束标签
+RAW_TEXT_TAGS = frozenset(["script", "style"])
+
+# 安全模式下允许的链接与图片地址协议，不带协议的相对地址总是允许
+SAFE_SCHEMES = frozenset(["http", "https", "ftp", "mailto"])
+URL_SCHEME = re.compile(r"([a-zA-Z][a-zA-Z0-9+.\-]*):")
+# 浏览器解析地址时忽略的空白与控制字符，判断协议前先去掉
+URL_IGNORED = re.compile(r"[\x00-\x20\x7f]+")
+
+
+def escape_html(text: str) -> str:
+    r"""
+    转义文本与双引号属性值中的`&`、`<`、`>`、`"`
+    >>> escape_html('<a href="x">')
+    '&lt;a href=&quot;x&quot;&gt;'
+    """
+    return (
+        text.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+    )
+
+
+def unescape_html(text: str) -> str:
+    r"""
+    `escape_html`的逆运算，只还原其转义的四个字符
+    """
+    if "&" not in text:
+        return text
+    return (
+        text.replace("&quot;", '"')
+        .replace("&gt;", ">")
+        .replace("&lt;", "<")
+        .replace("&amp;", "&")
+    )
+
+
+def escape_raw(text: str) -> str:
+    r"""
+    script等元素中的文本不解码实体，只把`<`写作`<\/`，其后不会构成标签；
+    `\/`在TeX中为不占宽度的斜体校正，公式的显示不变
+    """
+    return text.replace("<", "<\\/")
+
+
+def safe_url(url: str):
+    r"""
+    检查链接与图片地址的协议，允许时原样返回，否则返回None
+    地址可以已经转义：转义引入的`&`不是协议字符，不影响判断
+    >>> safe_url("javascript:alert(1)") is None
+    True
+    """
+    if ":" in url:
+        m = URL_SCHEME.match(URL_IGNORED.sub("", url))
+        if m is not None and m.group(1).lower() not in SAFE_SCHEMES:
+            return None
+    return url
+
+
+class RenderProfile:
+    r"""
+    由配置编译得到的渲染模板：各包装标签的tag、属性以及预先渲染好的开始/结束标签
+    由`Config`在创建时编译，取值相同的配置共享同一份；可pickle，随配置一同传给工作进程
+
+    :example
+    >>> profile = Config().profile
+    >>> profile.inline_code_open + "x = 1" + profile.inline_code_close
+    '<code class="codehilite">x = 1</code>'
+    """
+
+    __slots__ = (
+        "markdown_tag",
+        "markdown_attr",
+        "markdown_open",
+        "markdown_close",
+        "code_tag",
+        "code_attr",
+        "code_class",
+        "code_open",
+        "code_close",
+        "inline_code_open",
+        "inline_code_close",
+        "formula_tag",
+        "formula_attr",
+        "formula_open",
+        "formula_close",
+        "comment_tag",
+        "comment_open",
+        "comment_close",
+        "inline_memo",
+        "safe_mode",
+        "formula_raw",
+    )
+
+    def __init__(self, values: dict):
+        r"""
+        :param values --`Config`中的配置项
+        """
+        self.markdown_tag = values["markdown_tag"]
+        self.markdown_attr = values["markdown_attr"]
+        self.markdown_open = render_tag(self.markdown_tag, self.markdown_attr, ">")
+        self.markdown_close = "</%s>" % self.markdown_tag
+
+        self.code_tag = values["code_tag"]
+        self.code_attr = values["code_attr"]
+        # 代码区节点以该class识别，其中的文本包一层code
+        self.code_class = self.code_attr.get("class", "undefined")
+        self.code_open = render_tag(self.code_tag, self.code_attr, ">")
+        self.code_close = "</%s>" % self.code_tag
+        # 内嵌代码固定使用code标签与代码区的属性
+        self.inline_code_open = render_tag("code", self.code_attr, ">")
+        self.inline_code_close = "</code>"
+
+        self.formula_tag = values["formula_tag"]
+        self.formula_attr = values["formula_attr"]
+        self.formula_open = render_tag(self.formula_tag, self.formula_attr, ">")
+        self.formula_close = "</%s>" % self.formula_tag
+
+        self.comment_tag = values["comment_tag"]
+        self.comment_open = render_tag(self.comment_tag, {}, ">")
+        self.comment_close = "</%s>" % self.comment_tag
+
+        self.inline_memo = values["inline_memo"]
+
+        # 安全模式：文本、属性值转义，地址检查协议；公式区为script时按原始文本处理
+        self.safe_mode = values["safe_mode"]
+        self.formula_raw = self.formula_tag in RAW_TEXT_TAGS
@@ -1,5 +1,29 @@
+import os
+import time
+from itertools import repeat
+from typing import TYPE_CHECKING
+
+from m2h.compiled import CompiledTree
 from m2h.config import Config
-from m2h.mdNode import MarkDownNode
+from m2h.diff import diff_tree
+from m2h.incremental import IncrementalDocument
+from m2h.mdNode import LineFeeder, MarkDownNode, NodeView
+from m2h.mdNode import create_root as _create_root
+from m2h.profile import PROFILE, ConvertStats
+from m2h.reader import iter_buffer_lines, iter_lines
+from m2h.sections import SectionIndex
+
+# asyncio、进程池与sqlite导入较慢，只在用到的方法内导入，`import md`不必为此付出
+if TYPE_CHECKING:
+    from m2h.aio import AsyncExecutor
+    from m2h.cache import RenderCache
+
+
+def _convert_text(config: Config, markdown_text: str) -> str:
+    r"""
+    使用独立的节点树转换一段文本，供线程池/进程池调用
+    """
+    return _create_root(config).convert(markdown_text)
 
 
 class MarkDown:
@@ -7,9 +31,16 @@ class MarkDown:
     markdown文本转换
     """
 
-    def __init__(self, config: Config = None):
+    def __init__(
+        self,
+        config: Config = None,
+        cache: "RenderCache" = None,
+        executor: "AsyncExecutor" = None,
+    ):
         r"""
         :param `config` --自定义传入参数，or，使用默认参数
+        :param `cache` --可选的转换结果缓存，多个实例可共享同一缓存
+        :param `executor` --`aconvert`使用的执行器，默认使用进程内共享的执行器
 
         :example
         >>> from md import MarkDown
@@ -21,27 +52,31 @@ class MarkDown:
         >>> config = Config(...)
         >>> md = MarkDown(config)
         >>> ...
+        >>> # 缓存
+        >>> from m2h.cache import RenderCache
+        >>> md = MarkDown(config, cache=RenderCache(max_entries=4096))
+        >>> # asyncio
+        >>> from m2h.aio import AsyncExecutor
+        >>> md = MarkDown(config, executor=AsyncExecutor(max_workers=4))
         """
         if config is None:
             config = Config()
 
-        self._md_node = MarkDownNode(
-            tag=config.get("markdown_tag"), attr=config.get("markdown_attr")
-        )
-        self._md_node.set_config(config)
+        self._md_node = _create_root(config)
         self._config = config
-
+        self._cache = cache
+        self._executor = executor
 
         self._raw_markdown = None
         self._html = None
         self._tree = None
+        self._document = None
+        self._stats = None
 
     def set_config(self, config: Config):
-        self._md_node = MarkDownNode(
-            tag=config.get("markdown_tag"), attr=config.get("markdown_attr")
-        )
-        self._md_node.set_config(config)
+        self._md_node = _create_root(config)
         self._config = config
+        self._document = None
 
     def _clear(self) -> None:
         r"""
@@ -50,20 +85,432 @@ class MarkDown:
         self._raw_markdown = None
         self._html = None
         self._tree = None
+        self._document = None
+        self._stats = None
 
-    def convert(self, markdown_text: str) -> str:
+    def convert(self, markdown_text: str, profile=False) -> str:
         r"""
         将markdown文本转换为html
+        每次转换都使用独立的节点树与实例上的配置，同一实例可在多个线程中并发调用，
+        返回值互不影响；`get_html`与`get_dom_tree`反映最近一次完成的转换
         :param `markdown_text` --输入的文本
+        :param `profile` --为True时统计本次转换，或传入`ConvertStats`累计多次转换；
+            处于`with ConvertStats()`上下文中时也会统计；统计结果由`get_stats`获取
+
+        :example
+        >>> md.convert(md_text, profile=True)
+        >>> print(md.get_stats().to_prometheus())
         """
-        self._clear()
+        if isinstance(profile, ConvertStats):
+            stats = profile
+        elif profile:
+            stats = ConvertStats()
+        else:
+            stats = PROFILE.get()
+
+        key = None
+        hit = None
+        if self._cache is not None:
+            key = self._cache.make_key(markdown_text, self._config)
+            hit = self._cache.get(key)
+
+        tree = None
+        if hit is not None:
+            # 缓存只保存html，需要节点树时再重新解析
+            html, md_node = hit, None
+            if stats is not None:
+                stats.cache_hits += 1
+        else:
+            md_node = _create_root(self._config)
+            if stats is None:
+                html = md_node.convert(markdown_text)
+            else:
+                html, tree = self._convert_profiled(md_node, markdown_text, stats)
+            if key is not None:
+                self._cache.put(key, html)
+
+        if stats is not None:
+            stats.conversions += 1
+            stats.bytes_in += len(markdown_text.encode("utf-8", "surrogatepass"))
+            stats.bytes_out += len(html.encode("utf-8", "surrogatepass"))
+
+        self._md_node = md_node
+        self._raw_markdown = markdown_text
+        self._html = html
+        self._tree = tree
+        self._document = None
+        self._stats = stats
+
+        return html
+
+    @staticmethod
+    def _convert_profiled(md_node: MarkDownNode, markdown_text: str, stats):
+        r"""
+        与`MarkDownNode.convert`相同的流程，分阶段计时；dom树同时生成以统计其耗时
+        :return (html, tree)
+        """
+        with stats:
+            t0 = time.perf_counter()
+            lines = markdown_text.split("\n")
+            t1 = time.perf_counter()
+            feeder = LineFeeder(md_node)
+            for line in lines:
+                feeder.feed(line)
+            t2 = time.perf_counter()
+            html = md_node.to_html()
+            t3 = time.perf_counter()
+            tree = md_node.to_dict()
+            t4 = time.perf_counter()
+        stats.stage("split", t1 - t0)
+        stats.stage("parse", t2 - t1)
+        stats.stage("to_html", t3 - t2)
+        stats.stage("to_dict", t4 - t3)
+        stats.count_nodes(md_node)
+        return html, tree
+
+    def update(self, edit_range: tuple, new_text: str) -> str:
+        r"""
+        增量更新：替换上次转换文本中的若干行，只重新解析受影响的顶层块，
+        其余块沿用已有的节点与html；结果与对新文本整体`convert`一致
+        首次调用时会对当前文本做一次带分段信息的完整解析
+        :param `edit_range` --(起始行, 结束行)，左闭右开，行号从0开始
+        :param `new_text` --替换的文本，可包含多行；为None时仅删除
+
+        :example
+        >>> md = MarkDown()
+        >>> md.convert("# title\n\nhello")
+        >>> md.update((2, 3), "hello world")
+        """
+        if self._document is None:
+            config = self._config
+            self._document = IncrementalDocument(
+                lambda: _create_root(config), self._raw_markdown or ""
+            )
+        html = self._document.update(edit_range, new_text)
+
+        self._md_node = None
+        self._raw_markdown = None
+        self._html = html
+        self._tree = None
+        return html
+
+    def convert_many(self, texts, workers: int = None, process: bool = False) -> list:
+        r"""
+        批量转换，结果顺序与输入一致
+        :param `texts` --markdown文本序列
+        :param `workers` --并发数，默认由线程池/进程池自行决定
+        :param `process` --是否使用进程池；解析为纯python实现，多核加速需使用进程池
+
+        :example
+        >>> md = MarkDown()
+        >>> htmls = md.convert_many(texts, workers=4, process=True)
+        """
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        texts = list(texts)
+        if process:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            chunksize = max(1, len(texts) // ((workers or os.cpu_count() or 1) * 4))
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+            chunksize = 1
+        with executor:
+            return list(
+                executor.map(
+                    _convert_text, repeat(self._config), texts, chunksize=chunksize
+                )
+            )
+
+    def convert_parallel(
+        self, markdown_text: str, workers: int = None, executor=None
+    ) -> str:
+        r"""
+        单篇大文档的并行转换：按顶层块切分为若干段，在进程池中分段解析后按顺序拼接，
+        结果与`convert`逐字节一致；文档较小时直接串行转换
+        dom树在首次调用`get_dom_tree`时串行重新解析
+        :param `markdown_text` --输入的文本
+        :param `workers` --进程数，默认为cpu数
+        :param `executor` --可复用的进程池，为None时每次调用临时创建
+
+        :example
+        >>> from concurrent.futures import ProcessPoolExecutor
+        >>> with ProcessPoolExecutor(8) as pool:
+        ...     html = MarkDown().convert_parallel(big_text, workers=8, executor=pool)
+        """
+        from m2h.parallel import convert_parallel
+
+        html = convert_parallel(self._config, markdown_text, workers, executor)
+
+        self._md_node = None
+        self._raw_markdown = markdown_text
+        self._html = html
+        self._tree = None
+        self._document = None
+        self._stats = None
+        return html
+
+    def build_index(self, markdown_text: str) -> SectionIndex:
+        r"""
+        转换并在同一遍解析中构建章节索引（顶层标题、链接与图片）
+        :param `markdown_text` --输入的文本
+        :return SectionIndex --`get_html`与`get_dom_tree`返回本次转换的结果
 
+        :example
+        >>> index = md.build_index(md_text)
+        >>> [(s.level, s.slug, s.start, s.end) for s in index.sections]
+        """
+        self._clear()
+        md_node = _create_root(self._config)
+        index = SectionIndex.build(markdown_text, self._config, root=md_node)
+        self._md_node = md_node
         self._raw_markdown = markdown_text
-        self._html = self._md_node.convert(markdown_text)
-        self._tree = self._md_node.to_dict()
+        self._html = md_node.to_html()
+        return index
+
+    def convert_section(self, text_or_index, slug: str, index: SectionIndex = None):
+        r"""
+        只转换某一章节的行
+        :param `text_or_index` --markdown文本，or，由文件构建的`SectionIndex`（按字节区间
+            直接读取源文件中该章节的行）
+        :param `slug` --章节的slug
+        :param `index` --给出文本时可一并给出其索引，省去重新解析
+        :return str --章节的html，不存在时抛出KeyError
+
+        :example
+        >>> index = SectionIndex.from_file("guide.md")
+        >>> html = MarkDown().convert_section(index, "installation")
+        """
+        if isinstance(text_or_index, SectionIndex):
+            section_text = text_or_index.read_section(slug)
+        else:
+            if index is None:
+                index = SectionIndex.build(text_or_index, self._config)
+            section = index.find(slug)
+            lines = text_or_index.split("\n")
+            section_text = "\n".join(lines[section.start : section.end])
+        return self.convert(section_text)
+
+    @staticmethod
+    def compile(markdown_text: str) -> CompiledTree:
+        r"""
+        解析为与配置无关的已编译节点树，可保存后在任意配置下渲染
+        :param `markdown_text` --输入的文本
+
+        :example
+        >>> MarkDown.compile(md_text).dump("doc.m2ht")
+        >>> html = MarkDown(config).render_compiled(CompiledTree.load("doc.m2ht"))
+        """
+        return CompiledTree.from_text(markdown_text)
 
+    def render_compiled(self, tree: CompiledTree) -> str:
+        r"""
+        在当前配置下渲染已编译节点树，不重新解析；没有源文本，`get_dom_tree`返回空值
+        :param `tree` --`compile`或`CompiledTree.load`得到的节点树
+        """
+        self._clear()
+        self._md_node = None
+        self._html = tree.render(self._config)
         return self._html
 
+    def convert_stream(self, lines):
+        r"""
+        流式转换：逐行读取，每个顶层块闭合后立即产出对应的html片段
+        流式转换不保存完整的html与dom树，`get_html`与`get_dom_tree`返回空值
+        :param `lines` --文件对象或任意行迭代器
+
+        :example
+        >>> md = MarkDown()
+        >>> with open("doc.md", encoding="utf-8") as f:
+        ...     for chunk in md.convert_stream(f):
+        ...         out.write(chunk)
+        """
+        self._clear()
+        self._md_node = _create_root(self._config)
+        yield from self._md_node.convert_stream(lines)
+
+    def convert_file(self, path, out, encoding: str = "utf-8") -> int:
+        r"""
+        转换大文件：以内存映射读取输入，逐行解码并流式转换，html直接写入输出
+        内存占用只与当前未闭合的块有关，与文件大小无关；`get_html`与`get_dom_tree`返回空值
+        :param `path` --输入文件路径
+        :param `out` --输出文件路径，or，可写的文本文件对象
+        :param `encoding` --输入与输出的编码；输入开头有BOM时按BOM解码
+        :return int --写入的字符数
+
+        :example
+        >>> md = MarkDown()
+        >>> md.convert_file("export.md", "export.html")
+        """
+        if hasattr(out, "write"):
+            return self._write_stream(iter_lines(path, encoding), out)
+        with open(out, "w", encoding=encoding, newline="") as f:
+            return self._write_stream(iter_lines(path, encoding), f)
+
+    def convert_bytes(
+        self, data, encoding: str = "utf-8", out=None, out_encoding: str = "utf-8"
+    ):
+        r"""
+        转换字节输入：在缓冲区中逐行查找、解码并流式转换，不生成整篇的输入与输出str
+        开头的BOM决定实际编码，CRLF换行与LF等价；`get_html`与`get_dom_tree`返回空值
+        :param `data` --bytes、bytearray、memoryview或mmap
+        :param `encoding` --没有BOM时的输入编码
+        :param `out` --可选的二进制写入对象（有`write`方法），给出时html分块编码后写入
+        :param `out_encoding` --输出编码
+        :return bytes --html；给出`out`时返回写入的字节数
+
+        :example
+        >>> md = MarkDown()
+        >>> md.convert_bytes(b"\xef\xbb\xbf# title\r\n")
+        >>> md.convert_bytes(request_body, out=response.raw)
+        """
+        lines = iter_buffer_lines(data, encoding)
+        if out is not None:
+            return self._write_stream(lines, out, out_encoding)
+        return b"".join([_c.encode(out_encoding) for _c in self.convert_stream(lines)])
+
+    def _write_stream(self, lines, out, encoding: str = None) -> int:
+        r"""
+        流式转换并逐块写出；给出`encoding`时写入编码后的字节
+        :return int --写入的字符数，or，给出`encoding`时写入的字节数
+        """
+        written = 0
+        for chunk in self.convert_stream(lines):
+            if encoding is not None:
+                chunk = chunk.encode(encoding)
+            out.write(chunk)
+            written += len(chunk)
+        return written
+
+    async def aconvert(self, markdown_text: str, timeout: float = None) -> str:
+        r"""
+        `convert`的asyncio版本：大文档交给执行器的线程池（或进程池）转换，不阻塞事件循环
+        同时进行的转换数受执行器的并发上限约束；被取消或超时后，工作线程随即中止
+        使用进程池时节点树不返回，`get_dom_tree`首次调用时重新解析
+        :param `markdown_text` --输入的文本
+        :param `timeout` --秒数，包含排队等待的时间；超时抛出TimeoutError
+
+        :example
+        >>> md = MarkDown()
+        >>> html = await md.aconvert(md_text, timeout=2.0)
+        """
+        import asyncio
+
+        return await asyncio.wait_for(self._aconvert(markdown_text), timeout)
+
+    async def _aconvert(self, markdown_text: str) -> str:
+        from m2h.aio import convert_cancellable, default_executor
+
+        executor = self._executor or default_executor()
+        async with executor.limit():
+            if len(markdown_text) < executor.offload_size:
+                return self.convert(markdown_text)
+
+            key = None
+            hit = None
+            if self._cache is not None:
+                key = self._cache.make_key(markdown_text, self._config)
+                hit = self._cache.get(key)
+
+            if hit is not None:
+                html, md_node = hit, None
+            elif executor.processes:
+                md_node = None
+                html = await executor.run(_convert_text, self._config, markdown_text)
+                if key is not None:
+                    self._cache.put(key, html)
+            else:
+                md_node = _create_root(self._config)
+                html = await executor.run(convert_cancellable, md_node, markdown_text)
+                if key is not None:
+                    self._cache.put(key, html)
+
+        self._md_node = md_node
+        self._raw_markdown = markdown_text
+        self._html = html
+        self._tree = None
+        self._document = None
+        self._stats = None
+        return html
+
+    async def aconvert_stream(self, lines, timeout: float = None):
+        r"""
+        `convert_stream`的asyncio版本：逐行读取异步（或同步）行迭代器，每个顶层块闭合后
+        产出对应的html片段；在事件循环中解析，解析与输出html时每连续运行一段时间让出一次，
+        同一事件循环中的流式转换共同分享执行器的`time_slice`
+        :param `lines` --异步行迭代器，or，同步行迭代器
+        :param `timeout` --秒数，在每次让出时检查，超时抛出TimeoutError
+
+        :example
+        >>> md = MarkDown()
+        >>> async for chunk in md.aconvert_stream(request.content):
+        ...     await response.write(chunk.encode("utf-8"))
+        """
+        import asyncio
+
+        from m2h.aio import aiter_lines, default_executor
+
+        executor = self._executor or default_executor()
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        self._clear()
+        md_node = self._md_node = _create_root(self._config)
+
+        async def pause() -> float:
+            r"""
+            让出一次，返回下一段的截止时间
+            """
+            if deadline is not None and loop.time() > deadline:
+                raise TimeoutError("markdown stream conversion timed out")
+            # 经由定时器让出：已到期的其他定时器先于本任务运行；sleep(0)会排在
+            # 这些定时器之前，其他任务要再等一段
+            await asyncio.sleep(1e-6)
+            return loop.time() + executor.stream_slice()
+
+        async with executor.limit():
+            with executor.streaming():
+                feeder = LineFeeder(md_node)
+                yield md_node._open_tag
+
+                # 与`convert_stream`一致：空输入或以换行结尾时补一个空行
+                ended = True
+                slice_end = loop.time() + executor.stream_slice()
+                async for line in aiter_lines(lines):
+                    ended = line.endswith("\n")
+                    closed = feeder.feed(line[:-1] if ended else line)
+                    if closed or feeder.pending():
+                        # 逐个顶层块输出，其间同样检查时间
+                        parts = []
+                        for html in feeder.iter_flush():
+                            parts.append(html)
+                            if loop.time() >= slice_end:
+                                yield "".join(parts)
+                                parts = []
+                                slice_end = await pause()
+                        if parts:
+                            yield "".join(parts)
+
+                    if loop.time() >= slice_end:
+                        slice_end = await pause()
+                if ended:
+                    feeder.feed("")
+
+                parts = []
+                for html in feeder.iter_flush(last=True):
+                    parts.append(html)
+                    if loop.time() >= slice_end:
+                        yield "".join(parts)
+                        parts = []
+                        slice_end = await pause()
+                parts.append(md_node._close_tag)
+                yield "".join(parts)
+
+    def get_stats(self) -> ConvertStats:
+        r"""
+        获取最近一次转换的性能统计，未开启统计时返回None
+        """
+        return self._stats
+
     def get_html(self) -> str:
         r"""
         获取转换后的html文本
@@ -73,14 +520,82 @@ class MarkDown:
         else:
             return self._html
 
+    def _dom_root(self) -> MarkDownNode:
+        r"""
+        最近一次转换的节点树，增量更新或磁盘缓存命中后按需重建
+        """
+        if self._html is None:
+            return None
+        if self._md_node is None:
+            if self._document is not None:
+                self._md_node = self._document.root()
+            elif self._raw_markdown is None:
+                # 由已编译节点树渲染，没有源文本
+                return None
+            else:
+                md_node = _create_root(self._config)
+                md_node.convert(self._raw_markdown)
+                self._md_node = md_node
+        return self._md_node
+
     def get_dom_tree(self):
         r"""
-        获取转化后的dom树
+        获取转化后的dom树，首次调用时才由节点树生成
         """
         if self._tree is None:
-            return {}
-        else:
-            return self._tree
+            md_node = self._dom_root()
+            if md_node is None:
+                return {}
+            self._tree = md_node.to_dict()
+        return self._tree
+
+    def get_dom_view(self) -> NodeView:
+        r"""
+        获取节点树的只读视图，直接遍历节点树而不构建dict；未转换时返回None
+
+        :example
+        >>> md.convert(md_text)
+        >>> tag, attr, children = md.get_dom_view()
+        >>> for child in children:
+        ...     ...
+        """
+        md_node = self._dom_root()
+        return None if md_node is None else NodeView(md_node)
+
+    def diff_dom(self, previous) -> list:
+        r"""
+        当前节点树相对之前某次节点树的补丁，应用到之前的`get_dom_tree`上即得当前的
+        未变化的子树由结构哈希识别；增量更新沿用的节点无需重新计算
+        :param `previous` --之前`get_dom_view`得到的视图或节点树，为None时整体替换
+        :return list --补丁操作，见`m2h.diff.diff_tree`
+
+        :example
+        >>> previous = md.get_dom_view()
+        >>> md.update((10, 11), "new line")
+        >>> ops = md.diff_dom(previous)
+        """
+        md_node = self._dom_root()
+        if md_node is None:
+            return []
+        return diff_tree(previous, md_node)
+
+    def update_patch(self, edit_range: tuple, new_text: str) -> list:
+        r"""
+        增量更新，并返回相对更新前dom树的补丁，代替重新传输整棵dom树
+        参数同`update`
+
+        :example
+        >>> md.convert(md_text)
+        >>> tree = md.get_dom_tree()
+        >>> ops = md.update_patch((10, 11), "new line")
+        >>> apply_patch(tree, ops) == md.get_dom_tree()
+        True
+        """
+        previous = self._dom_root()
+        self.update(edit_range, new_text)
+        return self.diff_dom(previous)
 
     def __repr__(self) -> str:
+        if self._md_node is None:
+            return str(_create_root(self._config))
         return str(self._md_node)